@@ -0,0 +1,205 @@
+#!../venv/bin/python3
+"""Benchmark rate(), rate_many() and the rule engine offline
+
+Flair and TorchMoji are replaced by stub backends which tokenize with the real
+TorchMoji vocabulary and run a forward pass of comparable shape, so no model
+weights are needed. The corpus is synthesized from fixtures/reviews.txt.
+Results are written as JSON so runs can be compared over time."""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import re
+import resource
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+import wordsmyth
+from wordsmyth.batching import PADDING
+from wordsmyth.constants import EMOJIS, VOCAB_FILE_PATH
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+timings: dict[str, float] = defaultdict(float)
+
+
+def timed(stage: str, func: Callable) -> Callable:
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[stage] += time.perf_counter() - start
+
+    return wrapper
+
+
+def tokenize(texts: list[str], vocabulary: dict[str, int], length: int) -> np.ndarray:
+    tokens = np.zeros((len(texts), length), dtype=np.int64)
+    for i, text in enumerate(texts):
+        ids = [vocabulary.get(w, 1) for w in TOKEN_PATTERN.findall(text.lower())]
+        tokens[i, : len(ids[:length])] = ids[:length]
+    return tokens
+
+
+class StubFlair:
+    """Stands in for `wordsmyth.models.Flair`"""
+
+    def __init__(self, vocabulary: dict[str, int]) -> None:
+        rng = np.random.default_rng(0)
+        self.vocabulary = vocabulary
+        self.embeddings = rng.standard_normal((len(vocabulary), 64), np.float32)
+        self.layers = [rng.standard_normal((64, 64), np.float32) for _ in range(6)]
+
+    def predict_many(self, texts: list[str], batch_size: int = 32) -> list[dict]:
+        start = time.perf_counter()
+        tokens = tokenize(texts, self.vocabulary, max(len(t.split()) for t in texts) + 1)
+        timings["flair_tokenization"] += time.perf_counter() - start
+        PADDING["flair"].add(np.count_nonzero(tokens, axis=1), tokens.shape[1])
+
+        hidden = self.embeddings[tokens].mean(axis=1)
+        for layer in self.layers:
+            hidden = np.tanh(hidden @ layer)
+        scores = 1 / (1 + np.exp(-hidden.sum(axis=1)))
+        return [
+            {"sentiment": "pos" if s >= 0.5 else "neg", "score": float(max(s, 1 - s))}
+            for s in scores
+        ]
+
+    def predict(self, text: str) -> dict:
+        return self.predict_many([text])[0]
+
+
+class StubTorchMoji:
+    """Stands in for `wordsmyth.models.TorchMoji`"""
+
+    def __init__(self, vocabulary: dict[str, int]) -> None:
+        rng = np.random.default_rng(1)
+        self.vocabulary = vocabulary
+        self.embeddings = rng.standard_normal((len(vocabulary), 256), np.float32)
+        self.recurrent = rng.standard_normal((256, 256), np.float32) / 16
+        self.output = rng.standard_normal((256, len(EMOJIS)), np.float32)
+
+    def infer(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        start = time.perf_counter()
+        tokens = tokenize(texts, self.vocabulary, 100)
+        timings["torchmoji_tokenization"] += time.perf_counter() - start
+
+        # Padded to the longest text in the batch like the real model
+        lengths = np.count_nonzero(tokens, axis=1)
+        tokens = tokens[:, : max(1, int(lengths.max()))]
+        PADDING["torchmoji"].add(lengths, tokens.shape[1])
+
+        hidden = np.zeros((len(texts), 256), np.float32)
+        for step in self.embeddings[tokens].transpose(1, 0, 2):
+            hidden = np.tanh(step + hidden @ self.recurrent)
+        logits = hidden @ self.output
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True), lengths
+
+    def predict(self, text: str, top_n: int = 5) -> list[str]:
+        probabilities = self.infer([text])[0][0]
+        return [EMOJIS[i] for i in np.argsort(probabilities)[::-1][:top_n]]
+
+
+def corpus(size: int, seed: int = 0) -> list[str]:
+    """Synthesize reviews of one to twelve sentences, mostly short"""
+    with open(FIXTURES / "reviews.txt", encoding="utf-8") as fh:
+        sentences = [line.strip() for line in fh if line.strip()]
+
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choices(sentences, k=min(12, int(rng.expovariate(0.5)) + 1)))
+        for _ in range(size)
+    ]
+
+
+def install_stubs() -> None:
+    with open(VOCAB_FILE_PATH, encoding="utf-8") as fh:
+        vocabulary = json.load(fh)
+
+    flair, torch = StubFlair(vocabulary), StubTorchMoji(vocabulary)
+    flair.predict_many = timed("flair", flair.predict_many)  # type: ignore
+    torch.infer = timed("torchmoji", torch.infer)  # type: ignore
+    wordsmyth._models = lambda precision=None: (flair, torch)  # type: ignore
+    wordsmyth._rate_predictions = timed("rater", wordsmyth._rate_predictions)  # type: ignore
+
+
+def latency(texts: list[str]) -> dict[str, float]:
+    samples = []
+    for text in texts:
+        start = time.perf_counter()
+        wordsmyth.rate(text, flags=True)
+        samples.append(time.perf_counter() - start)
+
+    ms = np.array(samples) * 1000
+    percentiles = {f"p{p}": float(np.percentile(ms, p)) for p in (50, 90, 99)}
+    return {**percentiles, "mean": float(ms.mean())}
+
+
+def throughput(texts: list[str], batch_size: int) -> dict[str, Any]:
+    timings.clear()
+    for padding in PADDING.values():
+        padding.reset()
+    start = time.perf_counter()
+    wordsmyth.rate_many(texts, batch_size=batch_size, flags=True)
+    elapsed = time.perf_counter() - start
+
+    tokenization = timings["flair_tokenization"] + timings["torchmoji_tokenization"]
+    stages = {
+        "tokenization": tokenization,
+        "flair": timings["flair"] - timings["flair_tokenization"],
+        "torchmoji": timings["torchmoji"] - timings["torchmoji_tokenization"],
+        "rater": timings["rater"],
+    }
+    return {
+        "batch_size": batch_size,
+        "reviews_per_second": len(texts) / elapsed,
+        "seconds": elapsed,
+        "stage_fractions": {k: v / elapsed for k, v in stages.items()},
+        "padding_efficiency": wordsmyth.padding_efficiency(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reviews", type=int, default=2048)
+    parser.add_argument("--latency-reviews", type=int, default=256)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--output", help="JSON results file (stdout by default)")
+    args = parser.parse_args()
+
+    install_stubs()
+    texts = corpus(args.reviews)
+    wordsmyth.rate_many(texts[:8])  # compile the emojimap and fill caches
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "reviews": len(texts),
+        "latency_ms": latency(texts[: args.latency_reviews]),
+        "throughput": [throughput(texts, size) for size in args.batch_sizes],
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!../venv/bin/python3
+"""Compare ratings from quantized models against full precision on a fixture corpus
+
+Exits with a non-zero status when the star rating drift exceeds --max-drift"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from wordsmyth import rate_many
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures/reviews.txt")
+
+
+def timed_ratings(texts: list[str], precision: str) -> tuple[np.ndarray, float]:
+    rate_many(texts[:2], precision=precision)  # load models before timing
+
+    start = time.perf_counter()
+    ratings = rate_many(texts, rounded=False, precision=precision)
+    elapsed = time.perf_counter() - start
+
+    return np.array([rating for rating, _ in ratings]) * 10, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", default=FIXTURE, help="one review per line")
+    parser.add_argument("--precision", default="int8")
+    parser.add_argument(
+        "--max-drift", type=float, default=0.5, help="largest allowed drift in stars"
+    )
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as fh:
+        texts = [line.strip() for line in fh if line.strip()]
+
+    reference, reference_time = timed_ratings(texts, "fp32")
+    candidate, candidate_time = timed_ratings(texts, args.precision)
+    drift = np.abs(candidate - reference)
+
+    print(f"reviews: {len(texts)}")
+    print(f"fp32 time: {reference_time:.3f}s")
+    print(f"{args.precision} time: {candidate_time:.3f}s")
+    print(f"mean drift: {drift.mean():.4f} stars")
+    print(f"max drift: {drift.max():.4f} stars")
+    print(
+        "same rounded rating: "
+        f"{np.mean(np.round(candidate) == np.round(reference)) * 100:.1f}%"
+    )
+
+    if drift.max() > args.max_drift:
+        sys.exit(f"Drift exceeds {args.max_drift} stars")
+
+
+if __name__ == "__main__":
+    main()
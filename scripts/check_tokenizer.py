@@ -0,0 +1,83 @@
+#!../venv/bin/python3
+"""Check that wordsmyth's cached tokenizer gives the same token IDs as TorchMoji's
+SentenceTokenizer, and time both
+
+Runs over the fixture corpus, long synthesized reviews and a few edge cases.
+Exits with a non-zero status on any mismatch"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+from torchmoji.sentence_tokenizer import SentenceTokenizer
+
+from wordsmyth.constants import VOCAB_FILE_PATH
+from wordsmyth.tokenizer import Tokenizer
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures/reviews.txt")
+EDGE_CASES = [
+    "HELLO World!!!",
+    "Ünïcödé café, naïve résumé",
+    "emoji 😂😂 and ❤️ with variation selectors",
+    "line\nbreaks\r\nand\ttabs",
+    "@user check http://example.com #hashtag",
+    "numbers 123 4.56 and 7,890",
+    "a" * 500,
+    " ".join(["word"] * 150),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", default=FIXTURE, help="one review per line")
+    parser.add_argument("--repeat", type=int, default=20, help="passes for timing")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as fh:
+        sentences = [line.strip() for line in fh if line.strip()]
+    rng = random.Random(0)
+    texts = (
+        sentences
+        + [" ".join(rng.choices(sentences, k=rng.randint(2, 20))) for _ in range(200)]
+        + EDGE_CASES
+    )
+
+    with open(VOCAB_FILE_PATH, encoding="utf-8") as fh:
+        vocabulary = json.load(fh)
+    reference = SentenceTokenizer(vocabulary, 100)
+    tokenizer = Tokenizer(vocabulary, 100)
+
+    mismatches = 0
+    for text in texts:
+        expected = reference.tokenize_sentences([text])[0]
+        try:
+            actual = tokenizer.tokenize([text])
+        except ValueError:
+            actual = np.zeros((0, 100), np.int32)  # unreadable, SentenceTokenizer skips it
+        if expected.shape != actual.shape or not np.array_equal(expected, actual):
+            mismatches += 1
+            print(f"Mismatch for {text[:60]!r}:\n  {expected}\n  {actual}")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        reference.tokenize_sentences(texts)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        tokenizer.tokenize(texts)
+    cached_time = time.perf_counter() - start
+
+    print(f"{len(texts)} texts, {mismatches} mismatches")
+    print(f"SentenceTokenizer: {reference_time / args.repeat * 1000:.2f}ms per pass")
+    print(f"Tokenizer (cached): {cached_time / args.repeat * 1000:.2f}ms per pass")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
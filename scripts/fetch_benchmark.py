@@ -0,0 +1,111 @@
+#!../venv/bin/python3
+"""Fetch review pages from a local stub server to measure pages per second
+
+The stub serves fixtures/review_page.html for every review URL after an optional
+delay standing in for network latency, so no Amazon access or browser is needed.
+Pass --browser to compare against fetching the same pages with Firefox."""
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Thread
+from typing import Any
+
+from crawling.fetch import HTTPFetcher, SeleniumFetcher, review_url
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, page: bytes, delay: float, *args: Any) -> None:
+        self.page = page
+        self.delay = delay
+        super().__init__(*args)
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        time.sleep(self.delay)
+        if not self.path.startswith("/product-reviews/"):
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(self.page)))
+        self.send_header("Set-Cookie", "session-id=stub; Path=/")
+        self.end_headers()
+        self.wfile.write(self.page)
+
+    def log_message(self, *_: Any) -> None:
+        pass
+
+
+def serve(delay: float) -> ThreadingHTTPServer:
+    page = (FIXTURES / "review_page.html").read_bytes()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(StubHandler, page, delay))
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(fetcher: Any, urls: list[str]) -> dict[str, float]:
+    start = time.perf_counter()
+    if hasattr(fetcher, "fetch_many"):
+        pages = fetcher.fetch_many(urls)
+    else:
+        pages = [fetcher.fetch(url) for url in urls]
+    elapsed = time.perf_counter() - start
+    assert all("data-hook=\"review\"" in page for page in pages)
+    return {
+        "pages": len(pages),
+        "seconds": elapsed,
+        "pages_per_second": len(pages) / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--delay", type=float, default=0.05, help="response latency")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=None, help="requests per second")
+    parser.add_argument("--browser", action="store_true", help="also time Firefox")
+    args = parser.parse_args()
+
+    server = serve(args.delay)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [
+        review_url(f"B{n:09d}", n % 5 + 1, n % 10 + 1, base_url)
+        for n in range(args.pages)
+    ]
+
+    results = {}
+    with HTTPFetcher(connections=args.connections, rate=args.rate) as fetcher:
+        results["http"] = measure(fetcher, urls)
+        results["http"]["cookies"] = fetcher.cookies
+    results["http"]["peak_rss_mb"] = (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    )
+
+    if args.browser:
+        from crawling.pool import BrowserPool
+        from selenium.webdriver import Firefox, FirefoxOptions
+
+        opts = FirefoxOptions()
+        opts.add_argument("--headless")
+        pool = BrowserPool(1, partial(Firefox, options=opts))
+        try:
+            results["browser"] = measure(SeleniumFetcher(pool), urls[:50])
+        finally:
+            pool.close()
+
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
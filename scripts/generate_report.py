@@ -1,5 +1,9 @@
 #!/usr/bin/python3
+"""Report rating accuracy per product from a review store or its Parquet export
+
+Usage: generate_report.py [reviews.sqlite | reviews.parquet]"""
 import sqlite3
+import sys
 
 import pandas as pd
 from markdown import markdown
@@ -9,13 +13,13 @@ from sklearn.metrics import accuracy_score
 
 pd.options.mode.chained_assignment = None
 
-conn = sqlite3.connect("reviews.sqlite")
-tables = list(
-    map(
-        lambda x: x[0],
-        pd.read_sql("SELECT name FROM sqlite_master WHERE type='table';", conn).values,
+path = sys.argv[1] if len(sys.argv) > 1 else "reviews.sqlite"
+if path.endswith(".parquet"):
+    reviews = pd.read_parquet(path, columns=["product_id", "text", "actual", "prediction"])
+else:
+    reviews = pd.read_sql(
+        "SELECT product_id, text, actual, prediction FROM reviews", sqlite3.connect(path)
     )
-)
 
 print(
     """<link rel="stylesheet" href="github.css" />
@@ -24,15 +28,14 @@ print(
 p < 0.05 indicates significance
 """
 )
-for item in tables:
+for item, df in reviews.groupby("product_id"):
     print(f"<h2>{item}</h2>")
-    df = pd.read_sql(f"SELECT * from {item}", conn)
-    df.dropna(inplace=True)
+    df = df.drop(columns="product_id").dropna()
 
     print(markdown(f"**amazon rating**: {round(df.actual.mean(), 2)}\n"))
     print(markdown(f"**wordsmyth rating**: {round(df.prediction.mean(), 2)}"))
 
-    table = df.sample(5)
+    table = df.sample(min(5, len(df)))
     table.text = table.text.apply(lambda x: f"{x.strip()[:100]}...")
     table = table.to_markdown(index=False)
     print(markdown(table, extensions=[TableExtension()]))
@@ -4,60 +4,46 @@ from __future__ import annotations
 
 import os
 import sys
-from math import inf
-from uuid import uuid4
 import logging
 
-from sqlite3worker.sqlite3worker import Sqlite3Worker
-
 from crawling import bestsellers_reviews
+from crawling.frontier import Frontier
 from crawling.items import Reviews
-from wordsmyth import rate
+from crawling.pipeline import ReviewPipeline
+from wordsmyth import rate_many
+from wordsmyth.storage import RatedReview, ReviewStore
 
 
-def process_reviews(reviews: Reviews, db: Sqlite3Worker) -> None:
-    product_id = reviews.product_id
-    for review in reviews.items:
-        if review.text.strip() == "":
-            return
-        db.execute(
-            f"CREATE TABLE IF NOT EXISTS {product_id}(text, actual, prediction, flags)"
-        )
+MEDIA_ERROR = "The media could not be loaded."
 
-        try:
-            prediction, flags = rate(
-                review.text.replace(
-                    "                    The media could not be loaded.\n                ",
-                    "",
-                ).strip(),
-                flags=True,
-            )
-        except Exception as e:
-            logging.error(
-                "Exception raised when attempting to rate %s: %s", review.text, e
-            )
-            return
-        try:
-            db.execute(
-                f"INSERT INTO {product_id} VALUES(?, ?, ?, ?)",
-                (
-                    review.text,
-                    review.rating,
-                    prediction,
-                    ",".join(flags),
-                ),
-            )
-        except AttributeError:
-            db.execute(
-                f"INSERT INTO {product_id} VALUES(?, ?, ?, ?)",
-                (review.text, review.rating, prediction, flags),
-            )
+
+def rate_reviews(batch: list[Reviews]) -> list[RatedReview]:
+    """Rate reviews scraped from any number of products in a single batch,
+    skipping reviews with no text besides media"""
+    items = [
+        (reviews.product_id, review, text)
+        for reviews in batch
+        for review in reviews.items
+        for text in [review.text.replace(MEDIA_ERROR, "").strip()]
+        if text
+    ]
+    if not items:
+        return []
+
+    ratings = rate_many([text for *_, text in items], flags=True)
+    return [
+        RatedReview(product_id, review.text, review.rating, prediction, flags)
+        for (product_id, review, _), (prediction, flags) in zip(items, ratings)
+    ]
 
 
 def main() -> None:
     HEADLESS = True
 
-    location = f"{sys.argv[1].split('.')[0]}{str(uuid4())}.sqlite"
+    name = sys.argv[1].split(".")[0]
+    # One corpus per crawl name, so a resumed crawl keeps adding to it
+    location = f"{name}.sqlite"
+    frontier = f"{name}.frontier.sqlite"
 
     logging.basicConfig(
         format="[%(levelname)s] %(asctime)s: %(message)s",
@@ -68,15 +54,20 @@ def main() -> None:
     logging.getLogger("selenium").setLevel(logging.WARNING)
     logging.getLogger("urllib3").setLevel(logging.WARNING)
 
-    db = Sqlite3Worker(location, max_queue_size=inf)
     print(f"Writing reviews to {location} and logging at {location + '.log'}")
-    print("CTRL+C to exit at any time")
+    print(f"CTRL+C to exit at any time, the crawl resumes from {frontier}")
 
-    scraper = bestsellers_reviews(lambda x: process_reviews(x, db), HEADLESS)
-    try:
-        scraper(os.environ["EMAIL"], os.environ["PASSWORD"])
-    except KeyboardInterrupt:
-        sys.exit()
+    # Leaving the pipeline writes everything still queued, and checkpoints it,
+    # before the frontier and the store close
+    with ReviewStore(location) as db, Frontier(frontier) as queue, ReviewPipeline(
+        rate_reviews, db.add_many
+    ) as pipeline:
+        scraper = bestsellers_reviews(pipeline.submit, HEADLESS, frontier=queue)
+        try:
+            scraper(os.environ["EMAIL"], os.environ["PASSWORD"])
+        except KeyboardInterrupt:
+            logging.info("Interrupted, writing queued reviews")
+    logging.info("Pipeline finished: %s", pipeline.metrics())
 
 
 if __name__ == "__main__":
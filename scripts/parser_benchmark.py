@@ -0,0 +1,72 @@
+#!../venv/bin/python3
+"""Check review page parsing against golden files and time each parser backend
+
+Every fixtures/*.html page is parsed with each backend and compared with the
+expected reviews and links in fixtures/parsed_pages.json. Save real Amazon review
+pages next to them and run with --update to grow the corpus. Exits with status 1
+if any backend disagrees with the golden files."""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import timeit
+from dataclasses import asdict
+from pathlib import Path
+
+from crawling.parser import BACKENDS, parse_links, parse_reviews
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+GOLDEN = FIXTURES / "parsed_pages.json"
+
+
+def parse(page: str, backend: str) -> dict:
+    return {
+        "reviews": [asdict(review) for review in parse_reviews(page, backend)],
+        "links": parse_links(page, backend),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--update", action="store_true", help="rewrite golden files")
+    parser.add_argument("--repeat", type=int, default=200, help="parses per timing")
+    args = parser.parse_args()
+
+    pages = {path.name: path.read_text("utf-8") for path in FIXTURES.glob("*.html")}
+    if args.update:
+        golden = {name: parse(page, "bs4") for name, page in sorted(pages.items())}
+        GOLDEN.write_text(
+            json.dumps(golden, indent=2, ensure_ascii=False) + "\n", "utf-8"
+        )
+    golden = json.loads(GOLDEN.read_text("utf-8"))
+
+    failed = False
+    for name, page in pages.items():
+        for backend in BACKENDS:
+            if parse(page, backend) != golden.get(name):
+                print(f"{name}: {backend} output differs from golden file")
+                failed = True
+
+    results = {}
+    for backend in BACKENDS:
+        seconds = timeit.timeit(
+            f"[parse_reviews(page, {backend!r}) for page in pages]",
+            globals={"parse_reviews": parse_reviews, "pages": list(pages.values())},
+            number=args.repeat,
+        )
+        results[backend] = {
+            "pages_per_second": len(pages) * args.repeat / seconds,
+            "ms_per_page": seconds / (len(pages) * args.repeat) * 1000,
+        }
+    results["speedup"] = (
+        results["lxml"]["pages_per_second"] / results["bs4"]["pages_per_second"]
+    )
+    print(json.dumps(results, indent=2))
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,3 +14,13 @@ class CAPTCHAError(Exception):
 
 class AccountProtectionError(CAPTCHAError):
     """Detected by Amazon upon logging in and requires a CAPTCHA to proceed"""
+
+
+class FetchError(Exception):
+    """A page could not be fetched, or what was fetched is not the page asked for,
+    e.g. a CAPTCHA or an HTTP error. Retried, as the page may load next time"""
+
+    def __init__(self, url: str, reason: str) -> None:
+        super().__init__(f"{url}: {reason}")
+        self.url = url
+        self.reason = reason
@@ -0,0 +1,190 @@
+"""Backends which fetch review pages
+
+Review pages don't need a full browser render. `HTTPFetcher` downloads them over
+pooled keep-alive connections with the cookies of a logged-in browser, leaving
+Selenium for logging in and solving CAPTCHAs. `SeleniumFetcher` renders pages in
+leased browsers like before."""
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Protocol
+from urllib.parse import urlparse
+
+import urllib3
+from urllib3.exceptions import HTTPError
+
+from .exceptions import FetchError
+
+if TYPE_CHECKING:
+    from selenium.webdriver import Firefox
+
+    from .pool import BrowserPool
+
+AMAZON_URL = "https://www.amazon.com"
+MAP_STAR = {1: "one", 2: "two", 3: "three", 4: "four", 5: "five"}
+ROBOT_CHECK = "Sorry, we just need to make sure you're not a robot"
+# Present on review pages even when they list no reviews
+REVIEW_LIST = 'id="cm_cr-review_list"'
+
+
+def review_url(asin: str, category: int, page: int, base_url: str = AMAZON_URL) -> str:
+    """URL of a page of reviews with a star rating of `category`"""
+    return (
+        f"{base_url}/product-reviews/{asin}/"
+        f"?ie=UTF8&reviewerType=all_reviews&pageNumber={page}"
+        f"&filterByStar={MAP_STAR[category]}_star"
+    )
+
+
+class Fetcher(Protocol):
+    @property
+    def concurrency(self) -> int:
+        """Number of pages which can be fetched at once"""
+        ...
+
+    def fetch(self, url: str) -> str:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class SeleniumFetcher:
+    """Fetch pages by rendering them in browsers leased from a pool"""
+
+    def __init__(self, pool: BrowserPool) -> None:
+        self.pool = pool
+
+    @property
+    def concurrency(self) -> int:
+        return len(self.pool)
+
+    def fetch(self, url: str) -> str:
+        """Render a page, raising FetchError if it serves a CAPTCHA"""
+        with self.pool.lease() as browser:
+            browser.get(url)
+            page = browser.page_source
+            if ROBOT_CHECK in page:
+                raise FetchError(url, "served a CAPTCHA")
+            return page
+
+    def close(self) -> None:
+        """The pool is closed by its owner"""
+
+
+class RateLimiter:
+    """Spaces out requests to each host to at most `rate` per second"""
+
+    def __init__(self, rate: Optional[float]) -> None:
+        self.interval = 1 / rate if rate else 0.0
+        self._next: dict[str, float] = {}
+        self._lock = Lock()
+
+    def wait(self, host: str) -> None:
+        """Block until a request to `host` may be sent"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class HTTPFetcher:
+    """Fetch pages over a pool of keep-alive HTTP connections.
+
+    - `cookies` and `headers` are sent with every request; cookies set by responses
+        are kept for later requests
+    - `connections` is the number of connections (and concurrent requests) per host
+    - `rate` is the most requests per second sent to each host (unlimited if None)
+
+    Use `from_browser` to reuse the session of a logged-in browser"""
+
+    def __init__(
+        self,
+        *,
+        cookies: Optional[dict[str, str]] = None,
+        headers: Optional[dict[str, str]] = None,
+        connections: int = 8,
+        rate: Optional[float] = 4.0,
+        timeout: float = 10.0,
+        retries: int = 2,
+    ) -> None:
+        self.cookies = dict(cookies or {})
+        self.headers = {
+            "Accept": "text/html,application/xhtml+xml",
+            "Accept-Language": "en-US,en;q=0.9",
+            **(headers or {}),
+        }
+        self.connections = connections
+        self.limiter = RateLimiter(rate)
+        self.http = urllib3.PoolManager(
+            maxsize=connections,
+            block=True,
+            timeout=urllib3.Timeout(total=timeout),
+            retries=urllib3.Retry(
+                retries, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504)
+            ),
+        )
+        self._lock = Lock()
+
+    def __enter__(self) -> HTTPFetcher:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    @property
+    def concurrency(self) -> int:
+        return self.connections
+
+    @classmethod
+    def from_browser(cls, browser: Firefox, **kwargs: Any) -> HTTPFetcher:
+        """Fetch pages with the cookies and user agent of a browser session"""
+        cookies = {c["name"]: c["value"] for c in browser.get_cookies()}
+        user_agent = browser.execute_script("return navigator.userAgent")  # type: ignore
+        headers = {"User-Agent": user_agent, **kwargs.pop("headers", {})}
+        return cls(cookies=cookies, headers=headers, **kwargs)
+
+    def _request_headers(self) -> dict[str, str]:
+        with self._lock:
+            cookies = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        return {**self.headers, "Cookie": cookies} if cookies else self.headers
+
+    def _store_cookies(self, response: Any) -> None:
+        jar: SimpleCookie = SimpleCookie()
+        for header in response.headers.getlist("Set-Cookie"):
+            jar.load(header)
+        if jar:
+            with self._lock:
+                self.cookies.update({k: m.value for k, m in jar.items()})
+
+    def fetch(self, url: str) -> str:
+        """Download a page, raising FetchError if it fails or serves a CAPTCHA"""
+        self.limiter.wait(urlparse(url).netloc)
+        try:
+            response = self.http.request("GET", url, headers=self._request_headers())
+        except HTTPError as exc:
+            raise FetchError(url, str(exc)) from exc
+
+        self._store_cookies(response)
+        if response.status >= 400:
+            raise FetchError(url, f"HTTP {response.status}")
+        page = response.data.decode("utf-8", errors="replace")
+        if ROBOT_CHECK in page:
+            raise FetchError(url, "served a CAPTCHA")
+        return page
+
+    def fetch_many(self, urls: Iterable[str]) -> list[str]:
+        """Download pages concurrently, in order"""
+        with ThreadPoolExecutor(self.connections) as executor:
+            return list(executor.map(self.fetch, urls))
+
+    def close(self) -> None:
+        """Close all connections"""
+        self.http.clear()
@@ -0,0 +1,223 @@
+"""Persistent crawl frontier
+
+Every product ever queued is kept in a SQLite database, so products are scraped
+once however often they are discovered, and a crawl can be stopped at any time.
+Progress is checkpointed after every page of reviews, and a restarted crawl
+resumes products and star categories from the page after the last one scraped.
+Only pages which were being fetched when the crawl stopped are fetched again."""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import sqlite3
+import time
+from threading import Lock
+from typing import Iterable, NamedTuple, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products(
+    asin TEXT PRIMARY KEY,
+    priority REAL NOT NULL DEFAULT 0,
+    added REAL NOT NULL,
+    state INTEGER NOT NULL DEFAULT 0,
+    proportions TEXT
+);
+CREATE INDEX IF NOT EXISTS products_queue ON products(state, priority DESC, added);
+CREATE TABLE IF NOT EXISTS progress(
+    asin TEXT NOT NULL,
+    category INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    reviews INTEGER NOT NULL,
+    finished INTEGER NOT NULL,
+    PRIMARY KEY (asin, category)
+);
+"""
+
+QUEUED, ACTIVE, DONE = range(3)
+
+
+class Progress(NamedTuple):
+    """How far a star category of a product has been scraped"""
+
+    page: int
+    reviews: int
+    finished: bool
+
+
+class BloomFilter:
+    """A set of strings which may report false positives at `error_rate`
+    but takes a fixed amount of memory"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _indexes(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "little")
+        b = int.from_bytes(digest[8:], "little")
+        return ((a + i * b) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for index in self._indexes(item):
+            self.bits[index >> 3] |= 1 << (index & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self._indexes(item))
+
+
+class Frontier:
+    """Products waiting to be scraped, stored in a SQLite database at `path`.
+
+    Products are popped highest `priority` first, then oldest first. Products which
+    were being scraped when the crawl stopped are queued again on opening.
+
+    With `bloom`, products are checked against a Bloom filter sized for `capacity`
+    products instead of the database. This keeps very large crawls fast at the cost
+    of skipping roughly one in a thousand new products"""
+
+    def __init__(
+        self, path: str, *, bloom: bool = False, capacity: int = 10_000_000
+    ) -> None:
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            self.conn.execute(
+                "UPDATE products SET state = ? WHERE state = ?", (QUEUED, ACTIVE)
+            )
+
+        self.bloom: Optional[BloomFilter] = None
+        if bloom:
+            self.bloom = BloomFilter(capacity)
+            with self.lock:
+                for (asin,) in self.conn.execute("SELECT asin FROM products"):
+                    self.bloom.add(asin)
+
+    def __enter__(self) -> Frontier:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        """Number of queued products"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM products WHERE state = ?", (QUEUED,)
+            ).fetchone()[0]
+
+    def __contains__(self, asin: str) -> bool:
+        """Whether a product has ever been queued"""
+        with self.lock:
+            return (
+                self.conn.execute(
+                    "SELECT 1 FROM products WHERE asin = ?", (asin,)
+                ).fetchone()
+                is not None
+            )
+
+    def add(self, asins: Iterable[str], priority: float = 0) -> int:
+        """Queue products which have never been queued.
+        Returns the number of products added"""
+        if self.bloom is not None:
+            new = []
+            for asin in dict.fromkeys(asins):
+                if asin not in self.bloom:
+                    self.bloom.add(asin)
+                    new.append(asin)
+            asins = new
+
+        now = time.time()
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO products(asin, priority, added) "
+                "VALUES (?, ?, ?)",
+                ((asin, priority, now) for asin in asins),
+            )
+            return self.conn.total_changes - before
+
+    def pop(self, n: int = 1) -> list[str]:
+        """Take up to `n` queued products to scrape"""
+        with self.lock, self.conn:
+            asins = [
+                asin
+                for (asin,) in self.conn.execute(
+                    "SELECT asin FROM products WHERE state = ? "
+                    "ORDER BY priority DESC, added LIMIT ?",
+                    (QUEUED, n),
+                )
+            ]
+            self.conn.executemany(
+                "UPDATE products SET state = ? WHERE asin = ?",
+                ((ACTIVE, asin) for asin in asins),
+            )
+        return asins
+
+    def done(self, asin: str) -> None:
+        """Mark a product as completely scraped"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE products SET state = ? WHERE asin = ?", (DONE, asin)
+            )
+
+    def proportions(self, asin: str) -> Optional[list[int]]:
+        """Number of reviews to scrape from each star category of a product,
+        if they have been saved"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT proportions FROM products WHERE asin = ?", (asin,)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def set_proportions(self, asin: str, proportions: list[int]) -> None:
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE products SET proportions = ? WHERE asin = ?",
+                (json.dumps(proportions), asin),
+            )
+
+    def checkpoint(
+        self, asin: str, category: int, page: int, reviews: int, finished: bool
+    ) -> None:
+        """Record that `page` of a star category has been scraped, bringing the
+        category's total to `reviews`"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?, ?)",
+                (asin, category, page, reviews, finished),
+            )
+
+    def progress(self, asin: str) -> dict[int, Progress]:
+        """Progress of each star category of a product which has been started"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT category, page, reviews, finished FROM progress WHERE asin = ?",
+                (asin,),
+            ).fetchall()
+        return {
+            category: Progress(page, reviews, bool(finished))
+            for category, page, reviews, finished in rows
+        }
+
+    def stats(self) -> dict[str, int]:
+        """Number of queued, active and done products"""
+        with self.lock:
+            counts = dict(
+                self.conn.execute(
+                    "SELECT state, COUNT(*) FROM products GROUP BY state"
+                ).fetchall()
+            )
+        return {
+            "queued": counts.get(QUEUED, 0),
+            "active": counts.get(ACTIVE, 0),
+            "done": counts.get(DONE, 0),
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
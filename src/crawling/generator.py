@@ -3,11 +3,12 @@ from __future__ import annotations
 
 import logging
 import subprocess
-from itertools import count
-from typing import TYPE_CHECKING, Any, Callable, Protocol, cast
+from typing import TYPE_CHECKING, Any, Callable, List, Protocol, cast
 
+from .frontier import Frontier
 from .sync_reviews import AmazonScraper
 from .threaded_reviews import AmazonScraper as ParallelAmazonScraper
+from .threaded_reviews import Product
 
 if TYPE_CHECKING:
     from selenium.webdriver import Firefox
@@ -27,8 +28,24 @@ def kitty_captcha(browser: Firefox, _: Any) -> str:
     return input("(login) Please solve the provided captcha: ")
 
 
-def bestsellers_reviews(callback: Callable, headless: bool) -> Scraper:
-    """Returns a scraping function to scrape reviews from Amazon's bestselling"""
+def bestsellers_reviews(
+    callback: Callable,
+    headless: bool,
+    browsers: int = 5,
+    http: bool = False,
+    *,
+    frontier: Frontier,
+) -> Scraper:
+    """Returns a scraping function to scrape reviews from Amazon's bestselling
+
+    `browsers` is the number of browsers scraping reviews; products are scraped in
+    groups of that size. With `http`, review pages are downloaded without the
+    browsers once they are logged in.
+
+    Products found on review pages are crawled too. The crawl is saved in the
+    `frontier`, so it resumes where it stopped when restarted. Pages are
+    checkpointed as `callback`'s futures complete, so keep the frontier open until
+    they have, e.g. by closing it after the pipeline passed as `callback`"""
 
     def scraper(email: str, password: str) -> None:
         logging.info("Starting product ID gatherer")
@@ -41,29 +58,45 @@ def bestsellers_reviews(callback: Callable, headless: bool) -> Scraper:
                 len(product_ids),
                 ",".join(product_ids),
             )
+        frontier.add(product_ids, priority=1)
+        logging.info("Crawl frontier: %s", frontier.stats())
 
         logging.info("Initializing review gatherer")
 
         with AmazonScraper(headless) as prop:
-            with ParallelAmazonScraper(headless) as scrapers:
+            with ParallelAmazonScraper(headless, browsers) as scrapers:
                 scrapers.captcha_hook = kitty_captcha
                 logging.info("Logging scrapers in")
                 scrapers.login(email, password)
-                for i in count(1):
-                    logging.info("Starting round %s of scraping", i)
-                    for product_id in product_ids[:]:
-                        logging.info("Initiating scrape process for: %s", product_id)
-                        logging.info("\tCollecting review proportions")
-                        data = prop.get_extras(product_id)
-                        logging.info(
-                            "Collected %s following IDs: %s",
-                            len(data.products),
-                            ",".join(data.products),
-                        )
-                        logging.info("\tScraping")
-                        scrapers.scrape(product_id, callback, data.proportions)  # type: ignore
-
-                        product_ids.extend(data.products)
-                        product_ids.remove(product_id)
+                if http:
+                    scrapers.use_http(connections=browsers)
+
+                while True:
+                    group = frontier.pop(browsers)
+                    if not group:
+                        break
+                    products = [_product(prop, frontier, asin) for asin in group]
+                    logging.info("\tScraping %s", ",".join(group))
+                    # Products are marked done as their reviews are stored
+                    scrapers.scrape_many(products, callback, frontier)
+                    logging.info("Crawl frontier: %s", frontier.stats())
 
     return scraper
+
+
+def _product(prop: AmazonScraper, queue: Frontier, asin: str) -> Product:
+    """Review proportions of a product, queueing the products found beside them"""
+    logging.info("Initiating scrape process for: %s", asin)
+    proportions = queue.proportions(asin)
+    if proportions is None:
+        logging.info("\tCollecting review proportions")
+        data = prop.get_extras(asin)
+        logging.info(
+            "Collected %s following IDs: %s",
+            len(data.products),
+            ",".join(data.products),
+        )
+        proportions = cast(List[int], data.proportions)
+        queue.add(data.products)
+        queue.set_proportions(asin, proportions)
+    return asin, proportions
@@ -0,0 +1,138 @@
+"""Review page parsing
+
+Pages are parsed with lxml and precompiled XPath expressions when lxml is
+installed, which is several times faster than building a BeautifulSoup tree with
+`html.parser`. BeautifulSoup is used otherwise; both backends give the same results
+(see scripts/parser_benchmark.py)."""
+from __future__ import annotations
+
+import logging
+import re
+from typing import Any, Iterable, Optional
+
+from .items import Review
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # pragma: no cover
+    etree = lxml_html = None
+
+BACKENDS = ("lxml", "bs4")
+BACKEND = "lxml" if lxml_html is not None else "bs4"
+
+ASIN_PATTERN = re.compile(r"/(dp|product-reviews)/([A-Z0-9]{10})(?=[/?#]|$)")
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+if etree is not None:
+    _REVIEWS = etree.XPath("//div[@data-hook='review']")
+    _ROW = etree.XPath(f"(.//*[{_has_class('a-row')}])[1]")
+    _RATING = etree.XPath("(.//i[@data-hook='review-star-rating'])[1]")
+    _BODY = etree.XPath("(.//span[@data-hook='review-body'])[1]")
+    _LINKS = etree.XPath(f"//a[{_has_class('a-link-normal')}]/@href")
+
+
+def _rating(text: Optional[str]) -> int:
+    """Star rating from text like "4.0 out of 5 stars", -1 if there is none"""
+    if text is None:
+        return -1
+    return int(text.split(".")[0])
+
+
+def _document(page: str) -> Any:
+    try:
+        return lxml_html.document_fromstring(page)
+    except ValueError:
+        # Strings with an XML encoding declaration have to be parsed as bytes
+        return lxml_html.document_fromstring(page.encode("utf-8"))
+    except etree.ParserError:
+        return None
+
+
+def _lxml_reviews(page: str) -> list[Review]:
+    document = _document(page)
+    if document is None:
+        return []
+
+    reviews = []
+    for review in _REVIEWS(document):
+        row = _ROW(review)
+        if not row:
+            continue
+        rating, body = _RATING(row[0]), _BODY(row[0])
+        if not body:
+            continue
+        reviews.append(
+            Review(
+                body[0].text_content().strip(),
+                _rating(rating[0].text_content() if rating else None),
+            )
+        )
+    return reviews
+
+
+def select_reviews(content: Any) -> list[Review]:
+    """Select reviews from BeautifulSoup elements matching `div[data-hook='review']`"""
+    reviews = []
+    for review in content:
+        row = review.select_one(".a-row")
+        if row is None:
+            continue
+        rating = row.select_one("i[data-hook='review-star-rating']")
+        body = row.select_one("span[data-hook='review-body']")
+        if body is None:
+            continue
+        reviews.append(
+            Review(body.text.strip(), _rating(rating.text if rating else None))
+        )
+    return reviews
+
+
+def _bs4_reviews(page: str) -> list[Review]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page, "html.parser")
+    return select_reviews(soup.select("div[data-hook='review']"))
+
+
+def parse_reviews(page: str, backend: str = BACKEND) -> list[Review]:
+    """Extract reviews from an Amazon review page.
+
+    Reviews without a star rating are rated -1"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    reviews = _lxml_reviews(page) if backend == "lxml" else _bs4_reviews(page)
+    logging.debug("Selected %s", reviews)
+    return reviews
+
+
+def parse_links(page: str, backend: str = BACKEND) -> list[str]:
+    """Extract the targets of product links (`a.a-link-normal`) from a page, as
+    written in the page"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "lxml":
+        document = _document(page)
+        return [] if document is None else [str(href) for href in _LINKS(document)]
+
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page, "html.parser")
+    return [
+        link["href"] for link in soup.select("a.a-link-normal") if link.has_attr("href")
+    ]
+
+
+def extract_asins(hrefs: Iterable[Optional[str]], kind: str = "dp") -> list[str]:
+    """Unique ASINs in links to product pages (`kind="dp"`) or review pages
+    (`kind="product-reviews"`), in the order they appear"""
+    asins = []
+    for href in hrefs:
+        match = ASIN_PATTERN.search(href or "")
+        if match is not None and match.group(1) == kind:
+            asins.append(match.group(2))
+    return list(dict.fromkeys(asins))
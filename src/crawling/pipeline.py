@@ -0,0 +1,193 @@
+"""Write-behind pipeline between scraping, rating and storage
+
+Scraper callbacks only push `Reviews` onto a bounded queue, so browsers keep
+scraping while a rating stage consumes reviews in batches and a writer stage
+commits the results in bulk. When a stage falls behind, its full queue blocks
+the stage before it instead of growing.
+
+`submit` returns a future which completes once the reviews' rows are committed,
+so progress can be recorded only for reviews which were actually stored."""
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import Any, Callable, Generic, List, Optional, TypeVar
+
+from .items import Reviews
+
+T = TypeVar("T")
+_DONE = object()
+
+
+class _Receipt:
+    """Queued after the rows rated from a batch of submissions, completing their
+    futures once those rows are written"""
+
+    def __init__(self, futures: List[Future]) -> None:
+        self.futures = futures
+
+    def complete(self, error: Optional[BaseException]) -> None:
+        for future in self.futures:
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+
+class ReviewPipeline(Generic[T]):
+    """Rate and store scraped reviews in background threads.
+
+    - `rate` turns a batch of `Reviews` into rows to store. If it raises, the
+        batch's reviews are rated one at a time and only those which fail are lost
+    - `write` stores a batch of rows, e.g. in a single transaction
+    - `max_queue_size` bounds both queues; `submit` blocks while the first is full
+    - `batch_size` is the number of reviews rated at once and the number of rows
+        written at once
+    - `max_delay` is how long, in seconds, a partial batch may wait for more items
+
+    Pass `submit` as the scraper callback. It is safe to call from many threads."""
+
+    def __init__(
+        self,
+        rate: Callable[[List[Reviews]], List[T]],
+        write: Callable[[List[T]], Any],
+        *,
+        max_queue_size: int = 64,
+        batch_size: int = 64,
+        max_delay: float = 1.0,
+    ) -> None:
+        self.rate = rate
+        self.write = write
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.scraped: Queue = Queue(max_queue_size)
+        self.rated: Queue = Queue(max_queue_size)
+        self.counters = {"scraped": 0, "rated": 0, "written": 0, "errors": 0}
+        self._lock = Lock()
+
+        self._threads = [
+            Thread(target=self._rate_stage, name="rating", daemon=True),
+            Thread(target=self._write_stage, name="writing", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self) -> ReviewPipeline[T]:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def submit(self, reviews: Reviews) -> Future[None]:
+        """Queue scraped reviews, blocking while the rating stage is behind.
+
+        The returned future completes once the reviews' rows are written, or fails
+        with the writer's exception"""
+        future: Future[None] = Future()
+        self.scraped.put((reviews, future))
+        self._count("scraped", len(reviews.items))
+        return future
+
+    def metrics(self) -> dict[str, int]:
+        """Queue depths and item counters for each stage"""
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "scraped_queue_depth": self.scraped.qsize(),
+            "rated_queue_depth": self.rated.qsize(),
+            **counters,
+        }
+
+    def _count(self, counter: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += n
+
+    def _batches(self, queue: Queue, size: Callable[[Any], int]) -> Any:
+        """Yield lists of queued items holding up to `batch_size` items,
+        waiting at most `max_delay` for a batch to fill"""
+        batch: list = []
+        count = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = queue.get(timeout=timeout)
+            except Empty:
+                item = None
+
+            if item is not None and item is not _DONE:
+                batch.append(item)
+                count += size(item)
+                deadline = deadline or time.monotonic() + self.max_delay
+
+            if batch and (item is None or item is _DONE or count >= self.batch_size):
+                yield batch
+                batch, count, deadline = [], 0, None
+            if item is _DONE:
+                return
+
+    def _rate_stage(self) -> None:
+        for batch in self._batches(self.scraped, lambda item: len(item[0].items)):
+            reviews = [item[0] for item in batch]
+            try:
+                rows = self.rate(reviews)
+            except Exception as exc:
+                logging.error("Rating stage received exception: %s", exc)
+                rows = self._rate_each(reviews)
+            self._count("rated", len(rows))
+            for row in rows:
+                self.rated.put(row)
+            self.rated.put(_Receipt([future for _, future in batch]))
+        self.rated.put(_DONE)
+
+    def _rate_each(self, batch: List[Reviews]) -> List[T]:
+        """Rate reviews one at a time, skipping those which can't be rated"""
+        rows: List[T] = []
+        for reviews in batch:
+            for review in reviews.items:
+                try:
+                    rows.extend(self.rate([Reviews(reviews.product_id, [review])]))
+                except Exception as exc:
+                    self._count("errors")
+                    logging.error("Could not rate %r: %s", review.text[:80], exc)
+        return rows
+
+    def _write_stage(self) -> None:
+        # Rows are queued before the receipt of their submissions, so a failed write
+        # fails the receipts after its rows: those in its batch and, when rows are
+        # left over after its last receipt, the next one. Receipts before its first
+        # row belong to rows written by earlier batches
+        carried: Optional[BaseException] = None
+        for batch in self._batches(
+            self.rated, lambda item: 0 if isinstance(item, _Receipt) else 1
+        ):
+            rows = [item for item in batch if not isinstance(item, _Receipt)]
+            error: Optional[BaseException] = None
+            if rows:
+                try:
+                    self.write(rows)
+                except Exception as exc:
+                    error = exc
+                    self._count("errors")
+                    logging.error("Writing stage received exception: %s", exc)
+                else:
+                    self._count("written", len(rows))
+
+            failed: Optional[BaseException] = None
+            for item in batch:
+                if isinstance(item, _Receipt):
+                    item.complete(carried or failed)
+                    carried = None
+                else:
+                    failed = error
+            if not isinstance(batch[-1], _Receipt):
+                carried = carried or error
+
+    def close(self) -> None:
+        """Rate and write everything queued, then stop the stages"""
+        self.scraped.put(_DONE)
+        for thread in self._threads:
+            thread.join()
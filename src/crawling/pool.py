@@ -0,0 +1,123 @@
+"""Pool of reusable browsers leased out to scraping tasks"""
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from queue import Queue
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, Iterator, Optional
+
+from selenium.common.exceptions import WebDriverException
+
+from .exceptions import FetchError
+from .retry import CircuitBreaker
+
+if TYPE_CHECKING:
+    from selenium.webdriver import Firefox
+
+
+class BrowserPool:
+    """A fixed number of browsers which tasks lease one at a time.
+
+    - `factory` launches a new browser
+    - `setup` runs on browsers launched to replace crashed ones, e.g. to log them in
+    - `breaker` rests browsers which keep failing; leases go to other browsers
+        until they have rested
+
+    A browser which raises a WebDriverException while leased is health-checked when
+    it is returned, and replaced with a new one if it no longer responds"""
+
+    def __init__(
+        self,
+        size: int,
+        factory: Callable[[], Firefox],
+        *,
+        setup: Optional[Callable[[Firefox], None]] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        if size < 1:
+            raise ValueError("A browser pool needs at least one browser")
+
+        self.factory = factory
+        self.setup = setup
+        self.breaker = breaker
+        self.recycled = 0
+        self._lock = Lock()
+        self._idle: Queue[Firefox] = Queue()
+
+        with ThreadPoolExecutor() as executor:
+            self.browsers: list[Firefox] = list(
+                executor.map(lambda _: factory(), range(size))
+            )
+        for browser in self.browsers:
+            self._idle.put(browser)
+
+    def __len__(self) -> int:
+        return len(self.browsers)
+
+    @staticmethod
+    def healthy(browser: Firefox) -> bool:
+        """Whether a browser still responds to commands"""
+        try:
+            browser.title  # pylint: disable=pointless-statement
+        except WebDriverException:
+            return False
+        return True
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None) -> Iterator[Firefox]:
+        """Borrow an idle browser for the duration of a block"""
+        browser = self._take(timeout)
+        try:
+            yield browser
+        except (WebDriverException, FetchError) as exc:
+            if self.breaker is not None:
+                self.breaker.failure(browser.session_id)
+            if isinstance(exc, WebDriverException) and not self.healthy(browser):
+                browser = self.recycle(browser)
+            raise
+        else:
+            if self.breaker is not None:
+                self.breaker.success(browser.session_id)
+        finally:
+            self._idle.put(browser)
+
+    def _take(self, timeout: Optional[float]) -> Firefox:
+        """Take an idle browser, passing over resting ones while others are idle"""
+        passed = 0
+        while True:
+            browser = self._idle.get(timeout=timeout)
+            rest = self.breaker.remaining(browser.session_id) if self.breaker else 0
+            if rest <= 0:
+                return browser
+            self._idle.put(browser)
+            passed += 1
+            if passed >= len(self.browsers):
+                time.sleep(min(rest, 1.0))
+                passed = 0
+
+    def recycle(self, browser: Firefox) -> Firefox:
+        """Replace a crashed browser with a new one"""
+        logging.warning("Recycling unresponsive browser %s", browser.session_id)
+        try:
+            browser.quit()
+        except WebDriverException:
+            pass
+
+        replacement = self.factory()
+        if self.setup is not None:
+            self.setup(replacement)
+        with self._lock:
+            self.browsers[self.browsers.index(browser)] = replacement
+            self.recycled += 1
+        if self.breaker is not None:
+            self.breaker.success(browser.session_id)
+        return replacement
+
+    def close(self) -> None:
+        """Quit all browsers"""
+        with ThreadPoolExecutor() as executor:
+            for browser in self.browsers:
+                executor.submit(browser.quit)
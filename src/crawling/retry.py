@@ -0,0 +1,145 @@
+"""Retries with backoff and circuit breaking for the crawler
+
+Failed pages and logins are retried after a jittered, exponentially growing delay
+chosen by the class of the error, so throttling slows the crawl down instead of
+hammering Amazon. A browser which keeps failing is rested by its circuit breaker
+while the others carry on."""
+from __future__ import annotations
+
+import logging
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional, Type, TypeVar
+
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+from .exceptions import FetchError
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class Policy:
+    """Retry up to `attempts` tries in total, waiting a random time of up to
+    `base * 2 ** (retry - 1)` seconds (at most `cap`) before each retry"""
+
+    attempts: int = 3
+    base: float = 1.0
+    cap: float = 30.0
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait after failed try number `attempt`"""
+        return random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+
+
+# Matched against the classes of an error in method resolution order
+POLICIES: dict[Type[BaseException], Policy] = {
+    # Pages which have not finished loading
+    NoSuchElementException: Policy(attempts=5, base=0.5, cap=10),
+    # Crashed or unresponsive browsers
+    WebDriverException: Policy(attempts=3, base=2, cap=30),
+    # HTTP errors and CAPTCHAs, usually throttling
+    FetchError: Policy(attempts=4, base=5, cap=120),
+}
+
+
+class Retry:
+    """Decides whether and when to retry failures, counting retries and failures
+    per error class. Errors without a policy are not retried.
+
+    `policies` are added to (and override) the default `POLICIES`"""
+
+    def __init__(
+        self,
+        policies: Optional[dict[Type[BaseException], Policy]] = None,
+        *,
+        sleep: Callable[[float], Any] = time.sleep,
+    ) -> None:
+        self.policies = {**POLICIES, **(policies or {})}
+        self.sleep = sleep
+        self.counters: Counter[str] = Counter()
+        self._lock = Lock()
+
+    def policy(self, exc: BaseException) -> Optional[Policy]:
+        """The policy for an error, if it is retried at all"""
+        for cls in type(exc).__mro__:
+            if cls in self.policies:
+                return self.policies[cls]
+        return None
+
+    def backoff(self, exc: BaseException, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after failed try number `attempt`,
+        or None to give up"""
+        policy = self.policy(exc)
+        name = type(exc).__name__
+        with self._lock:
+            if policy is None or attempt >= policy.attempts:
+                self.counters["failures"] += 1
+                self.counters[f"failures.{name}"] += 1
+                return None
+            self.counters["retries"] += 1
+            self.counters[f"retries.{name}"] += 1
+        return policy.delay(attempt)
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call a function, retrying it according to the policies"""
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as exc:
+                delay = self.backoff(exc, attempt)
+                if delay is None:
+                    raise
+                logging.warning(
+                    "Retrying %s in %.1fs after exception: %s",
+                    getattr(func, "__name__", func),
+                    delay,
+                    exc,
+                )
+                self.sleep(delay)
+                attempt += 1
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+
+class CircuitBreaker:
+    """Rests anything identified by a key, e.g. a browser, for `cooldown` seconds
+    after `threshold` consecutive failures. Once rested it gets one more try before
+    being rested again"""
+
+    def __init__(self, threshold: int = 3, cooldown: float = 60.0) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.trips = 0
+        self._failures: Counter[Hashable] = Counter()
+        self._opened: dict[Hashable, float] = {}
+        self._lock = Lock()
+
+    def remaining(self, key: Hashable) -> float:
+        """Seconds until `key` may be used again, 0 if it may be used now"""
+        with self._lock:
+            opened = self._opened.get(key)
+        if opened is None:
+            return 0.0
+        return max(0.0, opened + self.cooldown - time.monotonic())
+
+    def success(self, key: Hashable) -> None:
+        with self._lock:
+            self._failures.pop(key, None)
+            self._opened.pop(key, None)
+
+    def failure(self, key: Hashable) -> None:
+        with self._lock:
+            self._failures[key] += 1
+            n = self._failures[key]
+            if n < self.threshold:
+                return
+            self._opened[key] = time.monotonic()
+            self.trips += 1
+        logging.warning("Resting %s for %ss after %s failures", key, self.cooldown, n)
@@ -5,16 +5,15 @@ Much of this is unused for scraping products in favor of crawling.threaded_revie
 from __future__ import annotations
 
 import time
-from typing import Any, Generator, cast
-from urllib.parse import urlparse
+from typing import Any, Generator
 
-from bs4 import BeautifulSoup
 from selenium.webdriver import Firefox, FirefoxOptions
 from selenium.webdriver.common.by import By
 from urllib3.exceptions import MaxRetryError
 
 from .exceptions import PrematureBrowserExit
 from .items import ProductPageInfo
+from .parser import extract_asins, parse_reviews
 
 
 class AmazonScraper:
@@ -35,6 +34,15 @@ class AmazonScraper:
     def __exit__(self, *_: Any) -> None:
         self.close()
 
+    def _links(self) -> list[str]:
+        """Scroll to the bottom of the page and return the targets of all product
+        links in a single round trip to the browser"""
+        return self.browser.execute_script(  # type: ignore
+            "window.scrollBy(0, document.body.scrollHeight);"
+            "const links = document.querySelectorAll('a.a-link-normal');"
+            "return Array.from(links, link => link.href);"
+        )
+
     def get_bestselling(self) -> list[str]:
         """Fetch product IDs from Amazon's Bestsellers page"""
         try:
@@ -43,43 +51,15 @@ class AmazonScraper:
             raise PrematureBrowserExit(
                 "Failed to access a browser session. Did you format your 'with' blocks correctly?"
             ) from e
-        ids = []
-        self.browser.execute_script("window.scrollBy(0, document.body.scrollHeight)")  # type: ignore
-        # TODO: speed up this code, it's noticably slow for some reason
-        for link in self.browser.find_elements(By.CSS_SELECTOR, "a.a-link-normal"):
-            try:
-                href = link.get_attribute("href")
-                if "product-reviews" not in cast(str, href):
-                    continue
-                ids.append(cast(str, urlparse(href).path).split("/")[2])
-            except Exception:
-                break
-        return list(set(ids))
-
-    @staticmethod
-    def select_reviews(content: Any) -> Generator[dict, None, None]:
-        """Select reviews from an Amazon page source"""
-        for review in content:
-            row = review.select_one(".a-row")
-            if row is not None:
-                rating = int(
-                    row.select_one("i[data-hook='review-star-rating']").text.split(".")[
-                        0
-                    ]
-                )
-                body = row.select_one("span[data-hook='review-body']").text
-                yield {"text": body, "rating": rating}
+        return extract_asins(self._links(), "product-reviews")
 
     def fetch_product_reviews(
         self, asin: str, pages: int = 10
     ) -> Generator[dict, None, None]:
         """Fetch reviews from a single product ASIN"""
         for page in self.get_product_source(asin, pages):
-            soup = BeautifulSoup(page, "html.parser")
-
-            content = soup.select("div[data-hook='review']")
-            for item in self.select_reviews(content):
-                yield {**item, "productId": asin}
+            for review in parse_reviews(page):
+                yield {"text": review.text, "rating": review.rating, "productId": asin}
 
     def get_extras(self, asin: str, total: int = 500) -> ProductPageInfo:
         """Return the distribution of reviews to gather from five to one star,
@@ -101,31 +81,23 @@ class AmazonScraper:
         while any(x > 100 for x in parsed):
             parsed = list(map(lambda x: x * 0.99, parsed))
 
-        ids = []
-        self.browser.execute_script("window.scrollBy(0, document.body.scrollHeight)")  # type: ignore
-        for link in self.browser.find_elements(By.CSS_SELECTOR, "a.a-link-normal"):
-            try:
-                href = link.get_attribute("href")
-                if "/dp/" not in cast(str, href):
-                    continue
-                ids.append(cast(str, urlparse(href).path).split("/")[3])
-            except Exception:
-                break
-
         return ProductPageInfo(
-            list(reversed(list(map(lambda x: int(x) + 1, parsed)))), list(set(ids))
+            list(reversed(list(map(lambda x: int(x) + 1, parsed)))),
+            extract_asins(self._links()),
         )
 
     def get_product_source(
-        self, asin: str, pages: int, delay: float = 0.5
+        self, asin: str, pages: int, delay: float = 0
     ) -> Generator[str, None, None]:
-        """Fetch n pages of reviews by product ID"""
+        """Fetch n pages of reviews by product ID, waiting `delay` seconds after
+        each page loads"""
         for page in range(1, pages + 1):
             self.browser.get(
                 f"https://www.amazon.com/product-reviews/{asin}/"
                 f"?ie=UTF8&reviewerType=all_reviews&pageNumber={page}"
             )
-            time.sleep(delay)
+            if delay:
+                time.sleep(delay)
             source = self.browser.page_source
             yield source
 
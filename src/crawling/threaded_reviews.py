@@ -1,20 +1,88 @@
 """Parallel review downloader"""
 from __future__ import annotations
 
+import heapq
 import logging
-from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import dataclass, field
 from functools import partial
-from itertools import count, zip_longest
-from typing import Any, Callable, Optional, cast
+from itertools import count
+from threading import Lock
+from typing import Any, Callable, Iterable, Optional, Tuple
 
-from bs4 import BeautifulSoup
-from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver import Firefox, FirefoxOptions
 from selenium.webdriver.common.by import By
 from typing_extensions import Self
 
-from .exceptions import AccountProtectionError, CAPTCHAError
+from .exceptions import AccountProtectionError, CAPTCHAError, FetchError
+from .fetch import (
+    AMAZON_URL,
+    MAP_STAR,
+    REVIEW_LIST,
+    ROBOT_CHECK,
+    Fetcher,
+    HTTPFetcher,
+    SeleniumFetcher,
+    review_url,
+)
+from .frontier import Frontier
 from .items import Review, Reviews
+from .parser import parse_reviews
+from .pool import BrowserPool
+from .retry import CircuitBreaker, Retry
+
+MAX_PAGES = 10
+
+# An ASIN and the number of reviews to scrape from each star category
+Product = Tuple[str, Optional[list]]
+
+
+@dataclass(frozen=True)
+class Task:
+    """A single page of reviews to scrape, `delay` seconds from now"""
+
+    asin: str
+    category: int
+    page: int
+    attempt: int = 1
+    delay: float = 0.0
+
+
+@dataclass
+class ProductState:
+    """Scraping state of a product: star categories still being scraped, pages
+    whose reviews are not stored yet, and whether any page was lost"""
+
+    categories: int
+    unstored: int = 0
+    failed: bool = False
+    lock: Lock = field(default_factory=Lock, repr=False)
+
+
+@dataclass
+class Category:
+    """Scraping state of a star category of a product.
+
+    - `remaining` is the number of reviews left to scrape, if limited
+    - `page` is the last page checkpointed and `reviews` the total up to it
+    - `stored` holds pages after it which are stored, waiting for the pages
+        before them, with their number of reviews and whether they are the last
+    - `lost` is the first page whose reviews were not stored. The category is
+        never checkpointed past it, so it is scraped again from there"""
+
+    remaining: Optional[int]
+    product: ProductState
+    page: int = 0
+    reviews: int = 0
+    stored: dict[int, tuple[int, bool]] = field(default_factory=dict)
+    lost: Optional[int] = None
 
 
 class AmazonScraper:
@@ -22,28 +90,44 @@ class AmazonScraper:
     Amazon scraper to fetch reviews from products with multi-threading
     with support for logging in and captcha handling
 
+    - `browsers` is the number of browsers to scrape with
+    - `retry` decides how often and how soon failed pages and logins are retried
+    - `breaker` rests browsers which keep failing
+    - `base_url` is the site review pages are fetched from
+
+    Review pages are rendered by the browsers until `use_http` is called.
     To set custom handlers for CAPTCHAs, modify the `captcha_hook` attribute
     """
 
-    def __init__(self, headless: bool = True) -> None:
+    def __init__(
+        self,
+        headless: bool = True,
+        browsers: int = 5,
+        retry: Optional[Retry] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        base_url: str = AMAZON_URL,
+    ) -> None:
         opts = FirefoxOptions()
         if headless:
             opts.add_argument("--headless")  # type: ignore
 
-        with ThreadPoolExecutor() as executor:
-            self.browsers: list[Firefox] = list(
-                map(
-                    lambda fut: fut.result(),
-                    as_completed(
-                        [executor.submit(Firefox, options=opts) for _ in range(5)]
-                    ),
-                )
-            )
-
+        self.pool = BrowserPool(
+            browsers,
+            partial(Firefox, options=opts),
+            breaker=breaker or CircuitBreaker(),
+        )
+        self.fetcher: Fetcher = SeleniumFetcher(self.pool)
+        self.retry = retry or Retry()
+        self.base_url = base_url
         self.captcha_hook: Callable[
             [Firefox, Optional[int]], str
         ] = self._default_captcha_hook
 
+    @property
+    def browsers(self) -> list[Firefox]:
+        """All browsers in the pool"""
+        return self.pool.browsers
+
     def __enter__(self) -> Self:
         return self
 
@@ -88,22 +172,20 @@ class AmazonScraper:
             browsers.append(browser_)
 
     def _login_single(self, browser: Firefox, email: str, password: str) -> None:
+        """Log in a browser, retrying while the login page is still loading"""
+        self.retry.call(self._login_attempt, browser, email, password)
+
+    def _login_attempt(self, browser: Firefox, email: str, password: str) -> None:
         browser.get("https://amazon.com")
-        try:
-            if (
-                "Sorry, we just need to make sure you're not a robot"
-                in browser.page_source
-            ):
-                raise CAPTCHAError(browser.session_id)
-            browser.find_element(By.ID, "nav-link-accountList").click()
-            browser.find_element(By.ID, "ap_email").send_keys(email)
-            browser.find_element(By.ID, "continue").click()
-            browser.find_element(By.ID, "ap_password").send_keys(password)
-            browser.find_element(By.ID, "signInSubmit").click()
-            if browser.title == "Authentication required":
-                raise AccountProtectionError(browser.session_id)
-        except NoSuchElementException:
-            self._login_single(browser, email, password)
+        if ROBOT_CHECK in browser.page_source:
+            raise CAPTCHAError(browser.session_id)
+        browser.find_element(By.ID, "nav-link-accountList").click()
+        browser.find_element(By.ID, "ap_email").send_keys(email)
+        browser.find_element(By.ID, "continue").click()
+        browser.find_element(By.ID, "ap_password").send_keys(password)
+        browser.find_element(By.ID, "signInSubmit").click()
+        if browser.title == "Authentication required":
+            raise AccountProtectionError(browser.session_id)
 
     def login(self, email: str, password: str) -> None:
         """Log in all browsers to Amazon with an email and password
@@ -127,70 +209,239 @@ class AmazonScraper:
                     for browser in captchad_browsers
                 ]
 
-    @staticmethod
-    def select_reviews(content: Any) -> list[Review]:
-        """Select reviews from a Amazon page source
-
-        Returns -1 if rating fails"""
-        reviews = []
-        for review in content:
-            row = review.select_one(".a-row")
-            if row is not None:
-                try:
-                    rating = int(
-                        row.select_one("i[data-hook='review-star-rating']").text.split(
-                            "."
-                        )[0]
-                    )
-                except AttributeError:
-                    rating = -1
-                body = row.select_one("span[data-hook='review-body']").text
-                reviews.append(Review(body.strip(), rating))
-        logging.debug("Selected %s", reviews)
+        # Browsers replacing crashed ones need to be logged in too
+        self.pool.setup = partial(self._login_single, email=email, password=password)
+
+    def use_http(self, **kwargs: Any) -> None:
+        """Fetch review pages over HTTP with the session of the first browser,
+        which should be logged in. Keyword arguments are passed to `HTTPFetcher`"""
+        self.fetcher.close()
+        self.fetcher = HTTPFetcher.from_browser(self.browsers[0], **kwargs)
+
+    def _scrape_page(self, task: Task) -> list[Review]:
+        logging.debug(
+            "Fetching %s star reviews in page %s for product %s",
+            MAP_STAR[task.category],
+            task.page,
+            task.asin,
+        )
+        url = review_url(task.asin, task.category, task.page, self.base_url)
+        source = self.fetcher.fetch(url)
+        reviews = parse_reviews(source)
+        # An empty page ends a star category, unless it is not a review page at all
+        if not reviews and REVIEW_LIST not in source:
+            raise FetchError(url, "not a review page")
         return reviews
 
-    def _scrape_single(
+    def scrape_many(
         self,
-        browser: Firefox,
-        asin: str,
-        category: int,
+        products: Iterable[Product],
         callback: Callable[[Reviews], Any],
-        limit: Optional[int] = None,
+        frontier: Optional[Frontier] = None,
     ) -> None:
-        map_star = {1: "one", 2: "two", 3: "three", 4: "four", 5: "five"}
-        counter = count(0)
+        """Scrape reviews from all star categories of several products at once.
 
-        logging.debug(
-            "Fetching %s reviews in %s star category for product %s",
-            limit,
-            map_star[category],
-            asin,
-        )
-        for page in range(1, 11):
-            logging.debug(
-                "Fetching %s star reviews in page %s for product %s",
-                map_star[category],
-                page,
-                asin,
+        Every page of every star category is a task run by whichever browser (or
+        HTTP connection) is free, so throughput grows with the number of browsers.
+        Pages of a star category are fetched in order until its proportion is met
+        or a page has no reviews. Failed pages wait for their retry here, leaving
+        every worker free to fetch other pages.
+
+        - `products` holds `(asin, proportions)` pairs; see `scrape`
+        - `callback` receives the reviews from each page. It is only called from
+            the thread running `scrape_many`. It may return a future which completes
+            once the reviews are stored, like `ReviewPipeline.submit` does
+        - `frontier` checkpoints each star category up to the last page which was
+            stored along with every page before it. A page is stored when the
+            callback returns, or once its future succeeds. Star categories which
+            were started before resume from the page after their last checkpoint.
+            Products are marked done once every star category is finished and
+            stored; products with pages given up on stay active, and are scraped
+            again from those pages when the frontier is next opened
+        """
+        categories: dict[tuple[str, int], Category] = {}
+        tasks = []
+        for asin, proportions in products:
+            proportions = list(proportions or [])
+            progress = frontier.progress(asin) if frontier is not None else {}
+            product = ProductState(0)
+            for category in MAP_STAR:
+                limit = (
+                    proportions[category - 1] if category <= len(proportions) else None
+                )
+                page, reviews, finished = progress.get(category, (0, 0, False))
+                if limit is not None:
+                    limit -= reviews
+                if not finished and (limit is None or limit > 0):
+                    categories[asin, category] = Category(
+                        limit, product, page, reviews
+                    )
+                    tasks.append(Task(asin, category, page + 1))
+                    product.categories += 1
+            if not product.categories and frontier is not None:
+                frontier.done(asin)
+
+        with ThreadPoolExecutor(self.fetcher.concurrency) as executor:
+            logging.debug("Scraping %s star categories", len(tasks))
+            pending: dict[Future, Task] = {}
+            # Tasks waiting for their delay by due time, ties in scheduling order
+            delayed: list[tuple[float, int, Task]] = []
+            order = count()
+
+            def schedule(task: Task) -> None:
+                if task.delay > 0:
+                    due = time.monotonic() + task.delay
+                    heapq.heappush(delayed, (due, next(order), task))
+                else:
+                    pending[executor.submit(self._scrape_page, task)] = task
+
+            for task in tasks:
+                schedule(task)
+            while pending or delayed:
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    task = heapq.heappop(delayed)[2]
+                    pending[executor.submit(self._scrape_page, task)] = task
+                timeout = delayed[0][0] - now if delayed else None
+                if not pending:
+                    time.sleep(timeout or 0)
+                    continue
+
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = pending.pop(future)
+                    state = categories[task.asin, task.category]
+                    follow_up = self._finish_task(
+                        task, future, state, callback, frontier
+                    )
+                    if follow_up is not None:
+                        schedule(follow_up)
+        logging.debug("Retry counters: %s", self.retry.stats())
+
+    def _finish_task(
+        self,
+        task: Task,
+        future: Future,
+        state: Category,
+        callback: Callable[[Reviews], Any],
+        frontier: Optional[Frontier] = None,
+    ) -> Optional[Task]:
+        """Pass a page's reviews to the callback and return the next task, if any"""
+        try:
+            items: list[Review] = future.result()
+        except Exception as exc:
+            delay = self.retry.backoff(exc, task.attempt)
+            if delay is None:
+                logging.error("Giving up on %s: %s", task, exc)
+                self._lose(task, state, frontier, categories=1)
+                return None
+            logging.warning(
+                "Retrying %s in %.1fs after exception: %s", task, delay, exc
             )
-            browser.get(
-                f"https://www.amazon.com/product-reviews/{asin}/"
-                f"?ie=UTF8&reviewerType=all_reviews&pageNumber={page}&filterByStar={map_star[category]}_star"
+            return Task(task.asin, task.category, task.page, task.attempt + 1, delay)
+
+        if state.remaining is not None:
+            items = items[: state.remaining]
+            state.remaining -= len(items)
+        logging.debug("Got %s items", len(items))
+
+        finished = not items or state.remaining == 0 or task.page >= MAX_PAGES
+        product = state.product
+        with product.lock:
+            product.unstored += 1
+        try:
+            stored = callback(Reviews(task.asin, items))
+        except Exception as exc:
+            logging.error(
+                "Callback for product %s received exception: %s", task.asin, exc
             )
-            soup = BeautifulSoup(browser.page_source, "html.parser")
-            content = soup.select("div[data-hook='review']")
-            items = []
-            for item in self.select_reviews(content):
-                if limit is not None and next(counter) >= limit:  # type: ignore
-                    return
-                items.append(item)
-            logging.debug("Got %s items", len(items))
-            try:
-                callback(Reviews(asin, items))
-            except Exception as exc:
-                logging.error(
-                    "Callback for product %s received exception: %s", asin, exc
-                )
+            self._lose(task, state, frontier, stored=1)
+        else:
+            self._when_stored(
+                stored,
+                partial(self._stored, task, len(items), finished, state, frontier),
+                partial(self._lose, task, state, frontier, stored=1),
+            )
+        if finished:
+            self._settle(task.asin, product, frontier, categories=1)
+            return None
+        return Task(task.asin, task.category, task.page + 1)
+
+    def _stored(
+        self,
+        task: Task,
+        reviews: int,
+        finished: bool,
+        state: Category,
+        frontier: Optional[Frontier],
+    ) -> None:
+        """Checkpoint a page once its reviews are stored, along with the stored
+        pages after it, unless a page before it was lost"""
+        with state.product.lock:
+            state.stored[task.page] = (reviews, finished)
+            page = state.page
+            while page + 1 in state.stored and (
+                state.lost is None or page + 1 < state.lost
+            ):
+                page += 1
+                reviews, finished = state.stored.pop(page)
+                state.reviews += reviews
+            if page > state.page:
+                state.page = page
+                if frontier is not None:
+                    frontier.checkpoint(
+                        task.asin, task.category, page, state.reviews, finished
+                    )
+        self._settle(task.asin, state.product, frontier, stored=1)
+
+    def _lose(
+        self, task: Task, state: Category, frontier: Optional[Frontier], **counts: int
+    ) -> None:
+        """Record that a page's reviews were not stored, so neither it nor any page
+        after it is checkpointed"""
+        with state.product.lock:
+            if state.lost is None or task.page < state.lost:
+                state.lost = task.page
+        self._settle(task.asin, state.product, frontier, lost=True, **counts)
+
+    @staticmethod
+    def _settle(
+        asin: str,
+        product: ProductState,
+        frontier: Optional[Frontier],
+        *,
+        categories: int = 0,
+        stored: int = 0,
+        lost: bool = False,
+    ) -> None:
+        """Count finished star categories, stored pages and lost pages of a product,
+        marking it done once everything was scraped and stored"""
+        with product.lock:
+            product.categories -= categories
+            product.unstored -= stored
+            product.failed = product.failed or lost
+            complete = not (product.categories or product.unstored or product.failed)
+        if complete and frontier is not None:
+            frontier.done(asin)
+
+    @staticmethod
+    def _when_stored(
+        stored: Any, func: Callable[[], Any], failed: Callable[[], Any]
+    ) -> None:
+        """Call `func` now, or once `stored` succeeds if it is a future,
+        and `failed` if it does not"""
+        if not isinstance(stored, Future):
+            func()
+            return
+
+        def done(future: Future) -> None:
+            if future.cancelled() or future.exception() is not None:
+                logging.error("Reviews were not stored, not checkpointing them")
+                failed()
+                return
+            func()
+
+        stored.add_done_callback(done)
 
     def scrape(
         self,
@@ -204,27 +455,10 @@ class AmazonScraper:
             The provided callback receives data of type `Review <src.crawling.Review>`
         - `proportions` is a list of the number of reviews to scrape from each category
             (none by default)
-
-        Note that callback functions are not run as thread-safe.
-        Use threading.Lock's where appropriate.
         """
-        if not proportions:
-            proportions = []
-
-        futures = []
-        with ThreadPoolExecutor() as executor:
-            logging.debug("Initializing thread pool to scrape %s", asin)
-            for i, browser, prop in zip_longest(
-                range(1, 6), self.browsers, proportions
-            ):
-                futures.append(
-                    executor.submit(
-                        self._scrape_single, browser, asin, i, callback, prop
-                    )
-                )
+        self.scrape_many([(asin, proportions)], callback)
 
     def close(self) -> None:
-        """Close all browsers"""
-        with ThreadPoolExecutor() as executor:
-            for browser in self.browsers:
-                executor.submit(browser.quit)
+        """Close all browsers and connections"""
+        self.fetcher.close()
+        self.pool.close()
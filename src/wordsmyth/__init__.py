@@ -1,26 +1,183 @@
-"""Wordsmyth - generate unbiased star ratings from user reviews and comments"""
+"""Wordsmyth - generate unbiased star ratings from user reviews and comments
+
+NumPy and the models are imported on first use, call `warmup()` to load them ahead of time"""
 from __future__ import annotations
 
-import json
+import os
+import time
 import warnings
 from functools import lru_cache
+from importlib import import_module
+from typing import TYPE_CHECKING, Iterable, overload
 
+from wordsmyth import instrument
+from wordsmyth.batching import length_batches, padding_efficiency
+from wordsmyth.chunking import combine, split_chunks
 from wordsmyth.constants import DIR_PATH
-from wordsmyth.items import Flags, Output
-from wordsmyth.rate import Rater
+from wordsmyth.emojimap import Emojimap
+from wordsmyth.items import Flags, Output, Prediction, Rating, Record
+from wordsmyth.rate import BatchRater, Rater
+
+if TYPE_CHECKING:
+    from wordsmyth.cache import PredictionCache
+
+
+def _precision(precision: str | None) -> str:
+    return precision or os.environ.get("WORDSMYTH_PRECISION", "fp32")
+
+
+def _models(precision: str | None = None):
+    return _load_models(_precision(precision))
 
 
 @lru_cache(maxsize=None)
-def _models():
+def _load_models(precision: str):
     from wordsmyth.models import Flair, TorchMoji
 
-    return Flair(), TorchMoji()
+    mmap_weights = os.environ.get("WORDSMYTH_MMAP_WEIGHTS", "0") != "0"
+    return Flair(mmap_weights, precision), TorchMoji(mmap_weights, precision)
+
+
+@lru_cache(maxsize=None)
+def _emojimap() -> Emojimap:
+    return Emojimap.load(f"{DIR_PATH}/data/emojimap.json")
 
 
 @lru_cache(maxsize=None)
-def _emojimap():
-    with open(f"{DIR_PATH}/data/emojimap.json", encoding="utf-8") as emojimap:
-        return json.load(emojimap)
+def _batch_rater() -> BatchRater:
+    return BatchRater(_emojimap())
+
+
+def warmup(text: str = "Warming up, but it should not take long!") -> dict[str, float]:
+    """Import and load both models and run a prediction through them, so that
+    the first `rate()` call does not pay for it.
+
+    Returns the seconds spent importing, loading and predicting"""
+    timings: dict[str, float] = {}
+
+    start = time.perf_counter()
+    import_module("numpy")
+    import_module("wordsmyth.models")
+    timings["import"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _models()
+    _batch_rater()
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rate_many([text, text.upper()])
+    timings["predict"] = time.perf_counter() - start
+
+    timings["total"] = sum(timings.values())
+    return timings
+
+
+def _predict(
+    texts: list[str],
+    batch_size: int,
+    cache: PredictionCache | None = None,
+    precision: str | None = None,
+) -> list[Prediction]:
+    """Run both models over texts in batches, skipping texts found in `cache`"""
+    precision = _precision(precision)
+    predictions: list[Prediction | None] = [None] * len(texts)
+    missing = list(range(len(texts)))
+
+    if cache is not None:
+        keys = [cache.key(text, precision) for text in texts]
+        first: dict[str, int] = {}
+        for i, key in enumerate(keys):
+            if key in first:
+                continue
+            first[key] = i
+            predictions[i] = cache.get(key)
+        missing = [i for i in first.values() if predictions[i] is None]
+
+    batches: list[list[int]] = []
+    if missing:
+        flair, torch = _models(precision)
+        # Batch texts of similar length together so little of each batch is padding
+        lengths = [len(texts[i].split()) for i in missing]
+        batches = [
+            [missing[j] for j in batch] for batch in length_batches(lengths, batch_size)
+        ]
+
+    for indices in batches:
+        batch = [texts[i] for i in indices]
+        sentiments = flair.predict_many(batch, batch_size)
+        probabilities, lengths = torch.infer(batch)
+
+        for i, sentiment, row, tokens in zip(
+            indices, sentiments, probabilities, lengths.tolist()
+        ):
+            predictions[i] = Prediction(
+                sentiment=sentiment, probabilities=row, tokens=tokens
+            )
+        if cache is not None:
+            cache.put_many([(keys[i], predictions[i]) for i in indices])  # type: ignore
+
+    if cache is not None:
+        predictions = [predictions[first[key]] for key in keys]
+
+    return predictions  # type: ignore
+
+
+def _predict_chunked(
+    texts: list[str],
+    batch_size: int,
+    cache: PredictionCache | None = None,
+    precision: str | None = None,
+    max_chunks: int | None = None,
+) -> list[Prediction]:
+    """`_predict`, splitting texts into at most `max_chunks` sentence chunks first.
+    The chunks of all texts are batched together and each text's chunk predictions
+    are combined into one"""
+    if max_chunks is None:
+        return _predict(texts, batch_size, cache, precision)
+
+    chunked = [split_chunks(text, max_chunks) for text in texts]
+    predictions = _predict(
+        [chunk for chunks in chunked for chunk in chunks], batch_size, cache, precision
+    )
+
+    combined: list[Prediction] = []
+    start = 0
+    for chunks in chunked:
+        combined.append(combine(predictions[start : start + len(chunks)]))
+        start += len(chunks)
+    return combined
+
+
+def _rate_predictions(
+    predictions: list[Prediction],
+    texts: list[str],
+    *,
+    emojis: int,
+    rounded: bool,
+    flags: bool,
+    rater: BatchRater | None = None,
+) -> list[Rating]:
+    """Run the rating rules over model predictions"""
+    import numpy as np
+
+    if not predictions:
+        return []
+
+    rater = rater or _batch_rater()
+    with instrument.stage("rater.evaluate"):
+        evaluation = rater.evaluate(
+            np.stack([p.probabilities for p in predictions]),
+            [p.sentiment["sentiment"] for p in predictions],
+            [p.sentiment["score"] for p in predictions],
+            texts,
+            emojis=emojis,
+            rounded=rounded,
+        )
+
+    if not flags:
+        return [(rating, None) for rating in evaluation.ratings.tolist()]
+    return list(zip(evaluation.ratings.tolist(), rater.flag_lists(evaluation.flags)))
 
 
 def rate(
@@ -29,13 +186,154 @@ def rate(
     emojis: int = 10,
     rounded: bool = True,
     flags: bool = False,
-) -> tuple[(int | float), list[Flags] | None]:
-    """Assign a star rating to text"""
+    cache: PredictionCache | None = None,
+    precision: str | None = None,
+    max_chunks: int | None = None,
+) -> Rating:
+    """Assign a star rating to text
+
+    Model predictions are looked up in and added to `cache` if one is given.
+    `precision` selects full (`fp32`) or quantized (`int8`) models, defaulting to
+    the WORDSMYTH_PRECISION environment variable or `fp32`.
+
+    With `max_chunks`, long text is split into up to that many chunks of whole
+    sentences, which the models read in full, and their predictions are combined
+    before rating. Otherwise TorchMoji only reads the first 100 tokens"""
+    if cache is not None or max_chunks is not None:
+        return rate_many(
+            [text],
+            emojis=emojis,
+            rounded=rounded,
+            flags=flags,
+            cache=cache,
+            precision=precision,
+            max_chunks=max_chunks,
+        )[0]
+
+    with instrument.call("rate"):
+        warnings.filterwarnings("ignore")
+        flair, torch = _models(precision)
+        output = Output(
+            sentiment=flair.predict(text), emojis=torch.predict(text, emojis), text=text
+        )
+
+        rater = Rater(output, _emojimap())
+        return rater.rate(rounded), rater.flags if flags else None
+
+
+def rate_many(
+    texts: Iterable[str],
+    *,
+    batch_size: int = 32,
+    emojis: int = 10,
+    rounded: bool = True,
+    flags: bool = False,
+    cache: PredictionCache | None = None,
+    precision: str | None = None,
+    max_chunks: int | None = None,
+) -> list[Rating]:
+    """Assign star ratings to many texts, running each model once per batch.
+
+    Results are returned in input order and match calling `rate()` on each text.
+    `cache`, `precision` and `max_chunks` work like they do for `rate()`, with the
+    chunks of all texts batched together"""
+    with instrument.call("rate_many"):
+        warnings.filterwarnings("ignore")
+        texts = list(texts)
+
+        return _rate_predictions(
+            _predict_chunked(texts, batch_size, cache, precision, max_chunks),
+            texts,
+            emojis=emojis,
+            rounded=rounded,
+            flags=flags,
+        )
+
+
+def predict(
+    texts: Iterable[str],
+    *,
+    batch_size: int = 32,
+    cache: PredictionCache | None = None,
+    precision: str | None = None,
+    max_chunks: int | None = None,
+) -> list[Record]:
+    """Run both models over texts and keep their raw outputs as compact records,
+    which `rerate()` can rate again without inference.
+
+    `cache`, `precision` and `max_chunks` work like they do for `rate()`"""
+    import numpy as np
+
     warnings.filterwarnings("ignore")
-    flair, torch = _models()
-    output = Output(
-        sentiment=flair.predict(text), emojis=torch.predict(text, emojis), text=text
-    )
+    texts = list(texts)
+
+    return [
+        Record(
+            text=text,
+            sentiment=prediction.sentiment["sentiment"],
+            score=float(prediction.sentiment["score"]),
+            probabilities=np.asarray(prediction.probabilities, dtype=np.float32),
+            tokens=prediction.tokens,
+        )
+        for text, prediction in zip(
+            texts, _predict_chunked(texts, batch_size, cache, precision, max_chunks)
+        )
+    ]
+
+
+@overload
+def rerate(
+    records: Record,
+    *,
+    emojis: int = ...,
+    rounded: bool = ...,
+    flags: bool = ...,
+    emojimap: Emojimap | list[dict] | None = ...,
+) -> Rating:
+    ...
+
+
+@overload
+def rerate(
+    records: Iterable[Record],
+    *,
+    emojis: int = ...,
+    rounded: bool = ...,
+    flags: bool = ...,
+    emojimap: Emojimap | list[dict] | None = ...,
+) -> list[Rating]:
+    ...
 
-    rater = Rater(output, _emojimap())
-    return rater.rate(rounded), rater.flags if flags else None
+
+def rerate(
+    records: Record | Iterable[Record],
+    *,
+    emojis: int = 10,
+    rounded: bool = True,
+    flags: bool = False,
+    emojimap: Emojimap | list[dict] | None = None,
+) -> Rating | list[Rating]:
+    """Rate records from `predict()` again with only the rating rules.
+
+    Pass `emojimap` to rate with a different emojimap than the bundled one"""
+    if isinstance(records, Record):
+        return rerate(
+            [records], emojis=emojis, rounded=rounded, flags=flags, emojimap=emojimap
+        )[0]
+
+    records = list(records)
+    return _rate_predictions(
+        [
+            Prediction(
+                sentiment={"sentiment": r.sentiment, "score": r.score},
+                probabilities=r.probabilities,
+                tokens=r.tokens,
+            )
+            for r in records
+        ],
+        [r.text for r in records],
+        emojis=emojis,
+        rounded=rounded,
+        flags=flags,
+        rater=BatchRater(emojimap) if emojimap is not None else None,
+    )
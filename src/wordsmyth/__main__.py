@@ -0,0 +1,98 @@
+"""Wordsmyth command line interface
+
+Without a command, reviews are rated from stdin (`wordsmyth rate`)"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+
+def rate(args: argparse.Namespace) -> None:
+    """Rate reviews from stdin, writing one JSON object per review to stdout"""
+    from wordsmyth.stream import rate_stream
+
+    for id_, rating, flags in rate_stream(
+        sys.stdin,
+        format=args.format,
+        batch_size=args.batch_size,
+        emojis=args.emojis,
+        rounded=not args.unrounded,
+        flags=args.flags,
+        precision=args.precision,
+        text_field=args.text_field,
+        id_field=args.id_field,
+    ):
+        record = {"id": id_, "rating": rating}
+        if args.flags:
+            record["flags"] = flags
+        sys.stdout.write(json.dumps(record) + "\n")
+
+
+def warmup(_: argparse.Namespace) -> None:
+    """Load the models ahead of time and report how long each phase took"""
+    from wordsmyth import warmup as warmup_models
+
+    for phase, seconds in warmup_models().items():
+        print(f"{phase}: {seconds:.3f}s")
+
+
+def export_weights(args: argparse.Namespace) -> None:
+    """Export model weights to memory-mappable files for WORDSMYTH_MMAP_WEIGHTS=1"""
+    import torch
+
+    from wordsmyth.constants import (
+        FLAIR_WEIGHTS_MMAP_PATH,
+        MODEL_WEIGHTS_MMAP_PATH,
+        MODEL_WEIGHTS_PATH,
+    )
+    from wordsmyth.weights import export_weights as export
+
+    export(torch.load(MODEL_WEIGHTS_PATH, map_location="cpu"), MODEL_WEIGHTS_MMAP_PATH)
+    print(f"Exported TorchMoji weights to {MODEL_WEIGHTS_MMAP_PATH}")
+
+    if args.flair:
+        from wordsmyth.models import Flair
+
+        export(Flair().sia.state_dict(), FLAIR_WEIGHTS_MMAP_PATH)
+        print(f"Exported Flair weights to {FLAIR_WEIGHTS_MMAP_PATH}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="wordsmyth", description="Generate star ratings from user content reviews"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rater = commands.add_parser("rate", help=rate.__doc__)
+    rater.add_argument(
+        "--format", choices=["auto", "lines", "jsonl", "csv"], default="auto"
+    )
+    rater.add_argument("--batch-size", type=int, default=64)
+    rater.add_argument("--emojis", type=int, default=10)
+    rater.add_argument("--unrounded", action="store_true")
+    rater.add_argument("--flags", action="store_true", help="include content flags")
+    rater.add_argument("--precision", choices=["fp32", "int8"])
+    rater.add_argument("--text-field", default="text")
+    rater.add_argument("--id-field", default="id")
+    rater.set_defaults(func=rate)
+
+    commands.add_parser("warmup", help=warmup.__doc__).set_defaults(func=warmup)
+
+    export = commands.add_parser("export-weights", help=export_weights.__doc__)
+    export.add_argument(
+        "--no-flair", dest="flair", action="store_false", help="only export TorchMoji"
+    )
+    export.set_defaults(func=export_weights)
+
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv or argv[0] not in commands.choices and argv[0] not in ("-h", "--help"):
+        argv = ["rate", *argv]
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
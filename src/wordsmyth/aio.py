@@ -0,0 +1,129 @@
+"""Asyncio front end which batches concurrent rating requests"""
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Dict, List, Tuple
+from weakref import WeakKeyDictionary
+
+from wordsmyth.items import Rating
+
+Options = Tuple[int, bool, bool]
+Pending = List[Tuple[str, "asyncio.Future[Rating]"]]
+
+
+class AsyncBatcher:
+    """Collect concurrent `rate` calls into batches which run in an executor.
+
+    A batch is sent once it holds `max_items` texts or `max_delay` milliseconds after
+    its first text arrived, whichever comes first. Requests with different options
+    are batched separately.
+
+    - `rate_many` rates a batch of texts (`wordsmyth.rate_many` by default,
+        or e.g. `InferencePool.rate_many`)
+    - `executor` runs batches off the event loop (the loop's default executor by default)
+    """
+
+    def __init__(
+        self,
+        *,
+        max_items: int = 32,
+        max_delay: float = 5.0,
+        rate_many: Callable[..., list[Rating]] | None = None,
+        executor: Executor | None = None,
+    ) -> None:
+        if rate_many is None:
+            from wordsmyth import rate_many
+
+        self.max_items = max_items
+        self.max_delay = max_delay / 1000
+        self.rate_many = rate_many
+        self.executor = executor
+        self._pending: Dict[Options, Pending] = {}
+        self._timers: Dict[Options, asyncio.TimerHandle] = {}
+
+    async def rate(
+        self,
+        text: str,
+        *,
+        emojis: int = 10,
+        rounded: bool = True,
+        flags: bool = False,
+    ) -> Rating:
+        """Assign a star rating to text, like `wordsmyth.rate`"""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[Rating] = loop.create_future()
+        options = (emojis, rounded, flags)
+
+        batch = self._pending.setdefault(options, [])
+        batch.append((text, future))
+        if len(batch) >= self.max_items:
+            self._flush(options)
+        elif options not in self._timers:
+            self._timers[options] = loop.call_later(
+                self.max_delay, self._flush, options
+            )
+
+        return await future
+
+    def _flush(self, options: Options) -> None:
+        timer = self._timers.pop(options, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(options, [])
+        if not batch:
+            return
+
+        emojis, rounded, flags = options
+        job = partial(
+            self.rate_many,
+            [text for text, _ in batch],
+            batch_size=len(batch),
+            emojis=emojis,
+            rounded=rounded,
+            flags=flags,
+        )
+        task = asyncio.get_running_loop().run_in_executor(self.executor, job)
+        task.add_done_callback(partial(self._resolve, batch))
+
+    @staticmethod
+    def _resolve(batch: Pending, task: asyncio.Future[list[Rating]]) -> None:
+        if task.cancelled():
+            for _, future in batch:
+                future.cancel()
+            return
+
+        exc = task.exception()
+        results: list[Any] = [None] * len(batch) if exc else task.result()
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+
+_batchers: WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncBatcher] = (
+    WeakKeyDictionary()
+)
+
+
+async def arate(
+    text: str,
+    *,
+    emojis: int = 10,
+    rounded: bool = True,
+    flags: bool = False,
+) -> Rating:
+    """Assign a star rating to text without blocking the event loop.
+
+    Concurrent calls on the same loop share a default `AsyncBatcher`"""
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = AsyncBatcher()
+
+    return await batcher.rate(text, emojis=emojis, rounded=rounded, flags=flags)
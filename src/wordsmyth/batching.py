@@ -0,0 +1,53 @@
+"""Length-bucketed batching
+
+Models pad every text in a batch to the longest one, so a single long review
+makes a whole batch of short ones expensive. Batching texts of similar length
+together keeps padding, and the compute spent on it, low."""
+from __future__ import annotations
+
+from threading import Lock
+from typing import Optional, Sequence
+
+
+def length_batches(lengths: Sequence[int], batch_size: int) -> list[list[int]]:
+    """Split the indices of `lengths` into batches of similar lengths, shortest first"""
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+class Padding:
+    """Counts the tokens fed to a model and the padded slots they took up"""
+
+    def __init__(self) -> None:
+        self.tokens = 0
+        self.slots = 0
+        self._lock = Lock()
+
+    def add(self, lengths: Sequence[int], width: Optional[int] = None) -> None:
+        """Count a batch of texts with `lengths` tokens padded to `width`
+        (the longest text by default)"""
+        if not len(lengths):
+            return
+        width = max(lengths) if width is None else width
+        with self._lock:
+            self.tokens += int(sum(lengths))
+            self.slots += len(lengths) * int(width)
+
+    @property
+    def efficiency(self) -> float:
+        """Fraction of padded slots holding real tokens"""
+        with self._lock:
+            return self.tokens / self.slots if self.slots else 1.0
+
+    def reset(self) -> None:
+        with self._lock:
+            self.tokens = self.slots = 0
+
+
+# Shared by all model instances
+PADDING = {"flair": Padding(), "torchmoji": Padding()}
+
+
+def padding_efficiency() -> dict[str, float]:
+    """Fraction of padded slots holding real tokens for each model so far"""
+    return {model: padding.efficiency for model, padding in PADDING.items()}
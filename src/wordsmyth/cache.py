@@ -0,0 +1,215 @@
+"""Cache of raw model predictions keyed by text content
+
+Only Flair and TorchMoji outputs are cached, so cached texts can be re-rated
+with any `emojis`/`rounded` arguments without running inference again."""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from wordsmyth.constants import MODEL_VERSION
+from wordsmyth.items import Prediction
+
+Entry = Tuple[float, Prediction]
+
+
+def normalize(text: str) -> str:
+    """Normalize unicode and whitespace so trivially different texts share a key"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text: str, version: str = MODEL_VERSION) -> str:
+    """Content hash of a normalized text and the model versions"""
+    return hashlib.sha256(f"{version}\0{normalize(text)}".encode("utf-8")).hexdigest()
+
+
+class Backend(Protocol):
+    """Persistent storage for cached predictions"""
+
+    def get(self, key: str) -> Entry | None:
+        ...
+
+    def put(self, key: str, entry: Entry) -> None:
+        ...
+
+    def put_many(self, entries: Sequence[Tuple[str, Entry]]) -> None:
+        ...
+
+    def delete(self, key: str) -> None:
+        ...
+
+
+class SQLiteBackend:
+    """Stores predictions in a SQLite database so they survive restarts"""
+
+    def __init__(self, path: str) -> None:
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions("
+                "key TEXT PRIMARY KEY, created REAL, sentiment TEXT, score REAL, "
+                "probabilities BLOB, tokens INTEGER)"
+            )
+
+    def get(self, key: str) -> Entry | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT created, sentiment, score, probabilities, tokens "
+                "FROM predictions WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+
+        created, sentiment, score, probabilities, tokens = row
+        return created, Prediction(
+            sentiment={"sentiment": sentiment, "score": score},
+            probabilities=np.frombuffer(probabilities, dtype=np.float32),
+            tokens=tokens,
+        )
+
+    def put(self, key: str, entry: Entry) -> None:
+        self.put_many([(key, entry)])
+
+    def put_many(self, entries: Sequence[Tuple[str, Entry]]) -> None:
+        """Store many predictions in a single transaction"""
+        rows = [
+            (
+                key,
+                created,
+                prediction.sentiment["sentiment"],
+                prediction.sentiment["score"],
+                np.asarray(prediction.probabilities, np.float32).tobytes(),
+                prediction.tokens,
+            )
+            for key, (created, prediction) in entries
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO predictions VALUES(?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def delete(self, key: str) -> None:
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM predictions WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        """Close the database"""
+        self.conn.close()
+
+
+class PredictionCache:
+    """A bounded in-memory LRU cache of predictions, optionally backed by
+    persistent storage.
+
+    - `max_items` bounds the number of predictions kept in memory
+    - `ttl` is the number of seconds a prediction stays valid (forever by default)
+    - `backend` is consulted on memory misses and written through on every `put`,
+        once per batch with `put_many`
+    - `version` is mixed into every key, so predictions from other models never match
+    """
+
+    def __init__(
+        self,
+        max_items: int = 100_000,
+        *,
+        ttl: float | None = None,
+        backend: Optional[Backend] = None,
+        version: str = MODEL_VERSION,
+    ) -> None:
+        self.max_items = max_items
+        self.ttl = ttl
+        self.backend = backend
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[str, Entry] = OrderedDict()
+        self._lock = Lock()
+
+    def key(self, text: str, precision: str = "fp32") -> str:
+        """Cache key for a text predicted at a precision"""
+        if precision == "fp32":
+            return cache_key(text, self.version)
+        return cache_key(text, f"{self.version}/{precision}")
+
+    def _expired(self, entry: Entry) -> bool:
+        return self.ttl is not None and time.time() - entry[0] > self.ttl
+
+    def get(self, key: str) -> Prediction | None:
+        """Look up a prediction, counting the hit or miss"""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                self._items.move_to_end(key)
+
+        if entry is None and self.backend is not None:
+            entry = self.backend.get(key)
+            if entry is not None and not self._expired(entry):
+                self._remember(key, entry)
+
+        if entry is not None and self._expired(entry):
+            self.delete(key)
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, prediction: Prediction) -> None:
+        """Store a prediction"""
+        entry = (time.time(), prediction)
+        self._remember(key, entry)
+        if self.backend is not None:
+            self.backend.put(key, entry)
+
+    def put_many(self, predictions: Sequence[Tuple[str, Prediction]]) -> None:
+        """Store a batch of predictions, writing them to the backend at once.
+        Backends without `put_many` get one `put` per prediction"""
+        now = time.time()
+        entries = [(key, (now, prediction)) for key, prediction in predictions]
+        for key, entry in entries:
+            self._remember(key, entry)
+        if self.backend is None or not entries:
+            return
+        put_many = getattr(self.backend, "put_many", None)
+        if put_many is not None:
+            put_many(entries)
+        else:
+            for key, entry in entries:
+                self.backend.put(key, entry)
+
+    def delete(self, key: str) -> None:
+        """Forget a prediction"""
+        with self._lock:
+            self._items.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def _remember(self, key: str, entry: Entry) -> None:
+        with self._lock:
+            self._items[key] = entry
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        """Hit and miss counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._items),
+            }
@@ -0,0 +1,96 @@
+"""Sentence chunking for long texts
+
+TorchMoji only reads the first 100 tokens of a text, while Flair reads all of it,
+so a long review loses most of its emoji signal and costs Flair time in proportion
+to its length. Splitting long texts into chunks of whole sentences lets both models
+read every chunk in the same batches as everything else, and capping the number of
+chunks bounds what a single review can cost."""
+from __future__ import annotations
+
+import re
+from typing import Iterator, Sequence
+
+from wordsmyth.items import Prediction
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\s*\n\s*")
+WORD = re.compile(r"\w")
+
+# Leaves TorchMoji room for the punctuation and emojis it counts as tokens
+CHUNK_WORDS = 60
+
+SIGNS = {"pos": 1, "neg": -1}
+
+
+def _sentences(text: str, max_words: int) -> Iterator[str]:
+    """Sentences of text, with those over `max_words` words split into pieces"""
+    for sentence in SENTENCE_END.split(text):
+        words = sentence.split()
+        if len(words) <= max_words:
+            yield sentence
+            continue
+        for i in range(0, len(words), max_words):
+            yield " ".join(words[i : i + max_words])
+
+
+def split_chunks(text: str, max_chunks: int, max_words: int = CHUNK_WORDS) -> list[str]:
+    """Split text into chunks of whole sentences of up to `max_words` words each.
+    Longer sentences are split every `max_words` words.
+
+    Texts with more than `max_chunks` chunks keep that many, spread evenly from
+    the first chunk to the last"""
+    if max_chunks < 1:
+        raise ValueError("Texts need at least one chunk")
+
+    chunks: list[str] = []
+    current: list[str] = []
+    words = 0
+    for sentence in _sentences(text, max_words):
+        n = len(sentence.split())
+        # Sentences without words, e.g. a lone emoticon, stay with the previous one
+        if current and words + n > max_words and WORD.search(sentence):
+            chunks.append(" ".join(current))
+            current, words = [], 0
+        if n:
+            current.append(sentence.strip())
+            words += n
+    if current:
+        chunks.append(" ".join(current))
+
+    if len(chunks) <= 1:
+        return [text]
+    if len(chunks) > max_chunks:
+        step = (len(chunks) - 1) / max(1, max_chunks - 1)
+        chunks = [chunks[round(i * step)] for i in range(max_chunks)]
+    return chunks
+
+
+def combine(predictions: Sequence[Prediction]) -> Prediction:
+    """Combine the predictions of a text's chunks into one, weighting each chunk
+    by the tokens TorchMoji read from it.
+
+    Emoji probabilities are averaged. Flair labels are read as signed scores
+    (negative for `neg`, zero for `neu`), averaged, and read back as a label and
+    a score, so chunks which disagree give a low score"""
+    import numpy as np
+
+    if len(predictions) == 1:
+        return predictions[0]
+
+    weights = np.array([max(1, p.tokens) for p in predictions], dtype=float)
+    weights /= weights.sum()
+    signed = np.array(
+        [
+            SIGNS.get(p.sentiment["sentiment"], 0) * p.sentiment["score"]
+            for p in predictions
+        ],
+        dtype=float,
+    )
+    score = float(weights @ signed)
+
+    return Prediction(
+        sentiment={"sentiment": "neg" if score < 0 else "pos", "score": abs(score)},
+        probabilities=(
+            weights @ np.stack([p.probabilities for p in predictions])
+        ).astype(predictions[0].probabilities.dtype),
+        tokens=sum(p.tokens for p in predictions),
+    )
@@ -20,4 +20,10 @@ EMOJIS = ":joy: :unamused: :weary: :sob: :heart_eyes: \
 )
 
 VOCAB_FILE_PATH = f"{DIR_PATH}/data/vocabulary.json"
+LEXICONS_PATH = f"{DIR_PATH}/data/lexicons.json"
 MODEL_WEIGHTS_PATH = f"{DIR_PATH}/data/pytorch_model.bin"
+MODEL_WEIGHTS_MMAP_PATH = f"{DIR_PATH}/data/torchmoji_weights"
+FLAIR_WEIGHTS_MMAP_PATH = f"{DIR_PATH}/data/flair_weights"
+
+# Identifies model outputs in caches, bump when either model changes
+MODEL_VERSION = "flair-en-sentiment/torchmoji-pytorch_model"
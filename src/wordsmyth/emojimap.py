@@ -0,0 +1,77 @@
+"""Emojimap compiled into immutable lookup tables"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Mapping
+
+from wordsmyth.constants import EMOJIS
+
+if TYPE_CHECKING:
+    import numpy as np
+
+NEG, NEU, POS = range(3)
+SENTIMENTS = ("neg", "neu", "pos")
+
+# Sentiments which differ from the emoji sentiment ranking the emojimap comes from
+OVERRIDES = {":cry:": "neg", ":grimacing:": "neu"}
+
+
+def _frozen(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+@dataclass(frozen=True)
+class Emojimap:
+    """An emojimap compiled once per process and shared between raters.
+
+    - `entries` maps emoji names to their (read-only) emojimap entries
+    - `sentiments`, `pos`, `neu` and `neg` are indexed like TorchMoji's output
+        (`wordsmyth.constants.EMOJIS`)
+    - `positive`, `neutral` and `negative` are the emoji names with each sentiment"""
+
+    entries: Mapping[str, Mapping[str, str]]
+    sentiments: np.ndarray
+    pos: np.ndarray
+    neu: np.ndarray
+    neg: np.ndarray
+    positive: frozenset[str]
+    neutral: frozenset[str]
+    negative: frozenset[str]
+
+    @classmethod
+    def compile(cls, emojimap: list[dict]) -> Emojimap:
+        """Build lookup tables from a list of emojimap entries, applying `OVERRIDES`"""
+        import numpy as np
+
+        entries = {
+            e["repr"]: MappingProxyType(
+                {**e, "sentiment": OVERRIDES.get(e["repr"], e["sentiment"])}
+            )
+            for e in emojimap
+        }
+        ordered = [entries[emoji] for emoji in EMOJIS]
+
+        def named(sentiment: str) -> frozenset[str]:
+            return frozenset(k for k, v in entries.items() if v["sentiment"] == sentiment)
+
+        return cls(
+            entries=MappingProxyType(entries),
+            sentiments=_frozen(
+                np.array([SENTIMENTS.index(e["sentiment"]) for e in ordered], np.int8)
+            ),
+            pos=_frozen(np.array([float(e["pos"]) for e in ordered])),
+            neu=_frozen(np.array([float(e["neu"]) for e in ordered])),
+            neg=_frozen(np.array([float(e["neg"]) for e in ordered])),
+            positive=named("pos"),
+            neutral=named("neu"),
+            negative=named("neg"),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Emojimap:
+        """Compile an emojimap JSON file"""
+        with open(path, encoding="utf-8") as emojimap:
+            return cls.compile(json.load(emojimap))
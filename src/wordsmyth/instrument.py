@@ -0,0 +1,217 @@
+"""Per-stage timing and profiling hooks
+
+Stages are timed only while a hook is registered, so instrumentation costs a
+list check per stage when unused. Hooks are called as `hook(stage, seconds)`:
+
+    with instrument.record() as metrics:
+        rate("Hello world")
+    print(metrics.seconds, metrics.counts)
+
+Stages recorded by wordsmyth are `rate`, `rate_many`, `flair`, `flair.lock_wait`,
+`torchmoji.tokenize`, `torchmoji.forward`, `rater.fix_content`, `rater.flag`,
+`rater.rate` and `rater.evaluate`."""
+from __future__ import annotations
+
+import logging
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from threading import Lock
+from typing import Any, Callable, ContextManager, Iterator, List, Optional
+
+Hook = Callable[[str, float], None]
+
+_hooks: List[Hook] = []
+_sampler: Optional[ProfileSampler] = None
+_NOOP = nullcontext()
+# Only one profiler may be active at a time
+_profiling = Lock()
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *_: Any) -> None:
+        elapsed = time.perf_counter() - self.start
+        for hook in _hooks:
+            hook(self.name, elapsed)
+
+
+def stage(name: str) -> ContextManager:
+    """Time a block of code as `name`"""
+    if not _hooks:
+        return _NOOP
+    return _Stage(name)
+
+
+def call(name: str) -> ContextManager:
+    """Time an entry point, profiling it if a `ProfileSampler` is active"""
+    if _sampler is not None:
+        return _sampler.sample(name)
+    return stage(name)
+
+
+def add_hook(hook: Hook) -> None:
+    """Call `hook(stage, seconds)` whenever a stage finishes"""
+    global _hooks
+    _hooks = [*_hooks, hook]
+
+
+def remove_hook(hook: Hook) -> None:
+    """Stop calling a hook added with `add_hook`"""
+    global _hooks
+    _hooks = [h for h in _hooks if h is not hook]
+
+
+class Metrics:
+    """A hook which accumulates total seconds and call counts per stage"""
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = defaultdict(float)
+        self.counts: dict[str, int] = defaultdict(int)
+        self._lock = Lock()
+
+    def __call__(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[name] += seconds
+            self.counts[name] += 1
+
+    def prometheus(self, prefix: str = "wordsmyth") -> str:
+        """Render totals in the Prometheus text exposition format"""
+        with self._lock:
+            seconds, counts = dict(self.seconds), dict(self.counts)
+
+        lines = [
+            f"# HELP {prefix}_stage_seconds_total Time spent in each stage",
+            f"# TYPE {prefix}_stage_seconds_total counter",
+            *(
+                f'{prefix}_stage_seconds_total{{stage="{name}"}} {value}'
+                for name, value in sorted(seconds.items())
+            ),
+            f"# HELP {prefix}_stage_calls_total Number of times each stage ran",
+            f"# TYPE {prefix}_stage_calls_total counter",
+            *(
+                f'{prefix}_stage_calls_total{{stage="{name}"}} {value}'
+                for name, value in sorted(counts.items())
+            ),
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class StatsD:
+    """A hook which sends every stage duration to StatsD as a timer over UDP"""
+
+    def __init__(
+        self, host: str = "localhost", port: int = 8125, prefix: str = "wordsmyth"
+    ) -> None:
+        import socket
+
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, name: str, seconds: float) -> None:
+        try:
+            self.socket.sendto(
+                f"{self.prefix}.{name}:{seconds * 1000:.3f}|ms".encode(), self.address
+            )
+        except OSError:
+            pass
+
+
+@contextmanager
+def record() -> Iterator[Metrics]:
+    """Collect stage timings for the duration of a block"""
+    metrics = Metrics()
+    add_hook(metrics)
+    try:
+        yield metrics
+    finally:
+        remove_hook(metrics)
+
+
+class ProfileSampler:
+    """Profiles a random `rate` of entry point calls with cProfile and passes
+    the stats of calls slower than `threshold` seconds to `sink`
+    (logged as warnings by default).
+
+    Start sampling with `start()` or by using the sampler as a context manager"""
+
+    def __init__(
+        self,
+        threshold: float = 1.0,
+        rate: float = 0.01,
+        sink: Callable[[str, float, str], None] | None = None,
+        limit: int = 25,
+    ) -> None:
+        self.threshold = threshold
+        self.rate = rate
+        self.sink = sink or self._log
+        self.limit = limit
+
+    @staticmethod
+    def _log(name: str, seconds: float, stats: str) -> None:
+        logging.warning("Slow %s call took %.3fs:\n%s", name, seconds, stats)
+
+    def __enter__(self) -> ProfileSampler:
+        self.start()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Sample entry point calls"""
+        global _sampler
+        _sampler = self
+
+    def stop(self) -> None:
+        """Stop sampling"""
+        global _sampler
+        if _sampler is self:
+            _sampler = None
+
+    @contextmanager
+    def sample(self, name: str) -> Iterator[None]:
+        """Time and possibly profile a single call. Calls made while another is
+        being profiled are only timed"""
+        if random.random() >= self.rate or not _profiling.acquire(blocking=False):
+            with stage(name):
+                yield
+            return
+
+        import cProfile
+        import io
+        import pstats
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # profiled outside of wordsmyth
+            _profiling.release()
+            with stage(name):
+                yield
+            return
+
+        start = time.perf_counter()
+        try:
+            with stage(name):
+                yield
+        finally:
+            profiler.disable()
+            _profiling.release()
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(
+                    self.limit
+                )
+                self.sink(name, elapsed, out.getvalue())
@@ -2,7 +2,12 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from enum import Enum
-from typing import Literal
+from typing import TYPE_CHECKING, Iterable, List, Literal, Optional, Tuple, Union
+
+from wordsmyth.constants import EMOJIS
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class Flags(str, Enum):
@@ -20,6 +25,21 @@ class Flags(str, Enum):
     POS_FLAIR_CONJUGATIONS = "pos_flair_and_conjugations"
 
 
+def flags_to_mask(flags: Iterable[Flags]) -> int:
+    """Pack flags into an integer, one bit per flag in definition order"""
+    members = list(Flags)
+    return sum(1 << members.index(Flags(flag)) for flag in set(flags))
+
+
+def mask_to_flags(mask: int) -> list[Flags]:
+    """Unpack flags packed by `flags_to_mask`"""
+    return [flag for i, flag in enumerate(Flags) if mask >> i & 1]
+
+
+Rating = Tuple[Union[int, float], Optional[List[Flags]]]
+"""A star rating and its flags, if requested"""
+
+
 @dataclass
 class Evaluation:
     """General data about a review and its outputs"""
@@ -43,3 +63,70 @@ class Output:
     sentiment: dict
     emojis: list[str]
     text: str
+
+
+@dataclass
+class Prediction:
+    """Raw Flair and TorchMoji outputs for a text, before any rating rules"""
+
+    sentiment: dict
+    probabilities: np.ndarray
+    tokens: int = 0
+
+
+@dataclass
+class Record:
+    """Compact raw model outputs for a text, enough to re-rate it without inference.
+
+    `probabilities` holds TorchMoji's 64 emoji probabilities as float32, and
+    `tokens` is the number of tokens TorchMoji read from the text. Lower precision
+    reorders nearly tied emojis, which changes ratings"""
+
+    text: str
+    sentiment: str
+    score: float
+    probabilities: np.ndarray
+    tokens: int
+
+    def to_dict(self) -> dict:
+        """A JSON-serializable form of the record"""
+        import base64
+
+        return {
+            "text": self.text,
+            "sentiment": self.sentiment,
+            "score": self.score,
+            "probabilities": base64.b64encode(self.probabilities.tobytes()).decode(),
+            "tokens": self.tokens,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Record:
+        """Load a record from `to_dict` output"""
+        import base64
+
+        import numpy as np
+
+        raw = base64.b64decode(data["probabilities"])
+        # Records used to be stored as float16
+        dtype = np.float16 if len(raw) == 2 * len(EMOJIS) else np.float32
+        return cls(
+            text=data["text"],
+            sentiment=data["sentiment"],
+            score=data["score"],
+            probabilities=np.frombuffer(raw, dtype=dtype),
+            tokens=data["tokens"],
+        )
+
+
+@dataclass
+class BatchEvaluation:
+    """Rule engine results for a batch of reviews, one row per review.
+
+    Emojis are indices into `wordsmyth.constants.EMOJIS`, and flag columns follow
+    `BatchRater.flag_order`"""
+
+    emojis: np.ndarray
+    picked: np.ndarray
+    flags: np.ndarray
+    ratings: np.ndarray
@@ -0,0 +1,83 @@
+"""Lexicons compiled into a regex
+
+Each lexicon is a named list of words and emojis, e.g. the conjunctions which
+flag mixed reviews. The terms of every lexicon are compiled into one
+case-insensitive regex, so checking a text is a single scan however many
+lexicons and terms there are. Words only match whole words ("but" does not match
+"button"), while emojis and other symbols match anywhere."""
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Mapping, Optional, Sequence, Tuple
+
+from wordsmyth.constants import LEXICONS_PATH
+
+
+def _term(term: str) -> str:
+    """Regex for a lexicon term, bounded if it starts or ends with a word character"""
+    pattern = re.escape(term)
+    if re.match(r"\w", term):
+        pattern = rf"\b{pattern}"
+    if re.search(r"\w$", term):
+        pattern = rf"{pattern}\b"
+    return pattern
+
+
+@dataclass(frozen=True)
+class Lexicon:
+    """Named lexicons compiled into one regex.
+
+    - `names` are the lexicon names, in the order they were given
+    - `pattern` matches any term of any lexicon, or is None without terms
+    - `terms` maps each casefolded term to the names of the lexicons holding it"""
+
+    names: Tuple[str, ...]
+    pattern: Optional[re.Pattern]
+    terms: Dict[str, FrozenSet[str]]
+
+    @classmethod
+    def compile(cls, lexicons: Mapping[str, Sequence[str]]) -> Lexicon:
+        """Compile lexicons given as lists of terms by name"""
+        terms: Dict[str, set] = {}
+        spellings = set()
+        for name, words in lexicons.items():
+            for term in filter(None, words):
+                terms.setdefault(term.casefold(), set()).add(name)
+                spellings.add(term)
+
+        pattern = None
+        if spellings:
+            # Longest first, so a term is not cut short by another it starts with
+            ordered = sorted(spellings, key=len, reverse=True)
+            pattern = re.compile("|".join(map(_term, ordered)), re.IGNORECASE)
+        return cls(
+            names=tuple(lexicons),
+            pattern=pattern,
+            terms={term: frozenset(names) for term, names in terms.items()},
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Lexicon:
+        """Compile a lexicons JSON file"""
+        with open(path, encoding="utf-8") as lexicons:
+            return cls.compile(json.load(lexicons))
+
+    def find(self, text: str) -> frozenset[str]:
+        """Names of the lexicons with a term in text"""
+        if self.pattern is None:
+            return frozenset()
+        return frozenset().union(
+            *(
+                self.terms.get(match.group().casefold(), ())
+                for match in self.pattern.finditer(text)
+            )
+        )
+
+
+@lru_cache(maxsize=None)
+def default_lexicon() -> Lexicon:
+    """The lexicons shipped with wordsmyth, compiled once per process"""
+    return Lexicon.load(LEXICONS_PATH)
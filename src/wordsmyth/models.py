@@ -3,14 +3,45 @@ from __future__ import annotations
 
 import json
 from threading import Lock
+from typing import Any
 
 from flair.data import Sentence
 from flair.models import TextClassifier
-from torchmoji.model_def import torchmoji_emojis
-from torchmoji.sentence_tokenizer import SentenceTokenizer
+from torchmoji.global_variables import NB_EMOJI_CLASSES, NB_TOKENS
+from torchmoji.model_def import TorchMoji as TorchMojiModel, torchmoji_emojis
+from torch import nn
 import numpy as np
+import torch
 
-from wordsmyth.constants import VOCAB_FILE_PATH, MODEL_WEIGHTS_PATH, EMOJIS
+from wordsmyth import instrument
+from wordsmyth.batching import PADDING, length_batches
+from wordsmyth.constants import (
+    EMOJIS,
+    FLAIR_WEIGHTS_MMAP_PATH,
+    MODEL_WEIGHTS_MMAP_PATH,
+    MODEL_WEIGHTS_PATH,
+    VOCAB_FILE_PATH,
+)
+from wordsmyth.tokenizer import Tokenizer
+from wordsmyth.weights import bind_weights
+
+
+PRECISIONS = ("fp32", "int8")
+
+
+def quantize(module: nn.Module, precision: str) -> nn.Module:
+    """Convert a model to a lower precision for faster CPU inference.
+
+    `int8` dynamically quantizes LSTM and linear layers, quantizing activations
+    on the fly while keeping weights in int8"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    if precision == "fp32":
+        return module
+
+    return torch.quantization.quantize_dynamic(
+        module, {nn.LSTM, nn.Linear}, dtype=torch.qint8
+    )
 
 
 def top_elements(array: np.ndarray, k: int) -> np.ndarray:
@@ -20,15 +51,34 @@ def top_elements(array: np.ndarray, k: int) -> np.ndarray:
 
 
 class TorchMoji:
-    """Abstracted TorchMoji model"""
+    """Abstracted TorchMoji model
+
+    With `mmap_weights`, weights are mapped from the export at `MODEL_WEIGHTS_MMAP_PATH`
+    (see `wordsmyth export-weights`) and shared between processes.
+    `precision` is passed to `quantize`; TorchMoji's LSTMs are custom modules,
+    so only its linear layers are quantized.
 
-    def __init__(self) -> None:
+    Texts are truncated to `max_sentence_length` tokens, but each batch is only
+    padded to its longest text"""
+
+    def __init__(self, mmap_weights: bool = False, precision: str = "fp32") -> None:
         with open(VOCAB_FILE_PATH, encoding="utf-8") as fh:
             vocabulary = json.load(fh)
 
         max_sentence_length = 100
-        self.tokenizer = SentenceTokenizer(vocabulary, max_sentence_length)
-        self.model = torchmoji_emojis(MODEL_WEIGHTS_PATH, return_attention=True)
+        self.tokenizer = Tokenizer(vocabulary, max_sentence_length)
+        if mmap_weights:
+            self.model = bind_weights(
+                TorchMojiModel(
+                    nb_classes=NB_EMOJI_CLASSES,
+                    nb_tokens=NB_TOKENS,
+                    return_attention=True,
+                ),
+                MODEL_WEIGHTS_MMAP_PATH,
+            )
+        else:
+            self.model = torchmoji_emojis(MODEL_WEIGHTS_PATH, return_attention=True)
+        self.model = quantize(self.model, precision)
 
     def predict(self, text: str | list, top_n: int = 5) -> list[str]:
         """Emoji prediction"""
@@ -36,29 +86,55 @@ class TorchMoji:
         if not isinstance(text, list):
             text = [text]
 
-        probabilities, _ = self.model(self.tokenizer.tokenize_sentences(text)[0])
+        return self.predict_many(text, top_n)[0]
+
+    def infer(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Emoji probabilities for a batch of texts in a single forward pass,
+        one row of 64 probabilities per text, and the number of tokens read from each"""
+        with instrument.stage("torchmoji.tokenize"):
+            tokens = self.tokenizer.tokenize(texts)
+
+        # Rows are read up to their last token, so the padding beyond the
+        # longest text in the batch can be dropped without changing the output
+        lengths = np.count_nonzero(tokens, axis=1)
+        width = max(1, int(lengths.max()))
+        PADDING["torchmoji"].add(lengths, width)
 
-        emoji_ids = top_elements(probabilities[0], top_n)
-        emojis = list(map(lambda x: EMOJIS[x], emoji_ids))
+        with instrument.stage("torchmoji.forward"):
+            probabilities, _ = self.model(tokens[:, :width])
+        return probabilities, lengths
+
+    def probabilities(self, texts: list[str]) -> np.ndarray:
+        """Emoji probabilities for a batch of texts in a single forward pass"""
+        return self.infer(texts)[0]
+
+    def predict_many(self, texts: list[str], top_n: int = 5) -> list[list[str]]:
+        """Batched emoji prediction, in input order"""
+        return [
+            list(map(lambda x: EMOJIS[x], top_elements(row, top_n)))
+            for row in self.probabilities(texts)
+        ]
 
-        return emojis
 
 class Flair:
-    """Abstracted Flair `en-sentiment` sentiment classifier"""
+    """Abstracted Flair `en-sentiment` sentiment classifier
+
+    With `mmap_weights`, the loaded weights are swapped for the export at
+    `FLAIR_WEIGHTS_MMAP_PATH` and shared between processes. Flair has no way to build
+    a model without loading its weights, so this only lowers memory after loading.
+    `precision` is passed to `quantize`"""
 
-    def __init__(self) -> None:
+    def __init__(self, mmap_weights: bool = False, precision: str = "fp32") -> None:
         self.sia = TextClassifier.load("en-sentiment")
+        if mmap_weights:
+            bind_weights(self.sia, FLAIR_WEIGHTS_MMAP_PATH)
+        self.sia = quantize(self.sia, precision)
         self.lock = Lock()
 
-    def predict(self, text: str) -> dict[str, str | float]:
-        """Predict text sentiment"""
-
-        with self.lock:
-            sentence = Sentence(text)
-            self.sia.predict(sentence)
-
-            sent = sentence.labels[0]
-            score = sentence.score
+    @staticmethod
+    def _label(sentence: Sentence) -> dict[str, str | float]:
+        sent = sentence.labels[0]
+        score = sentence.score
 
         if "POSITIVE" in str(sent):
             return {"sentiment": "pos", "score": score}
@@ -67,3 +143,36 @@ class Flair:
             return {"sentiment": "neg", "score": score}
 
         return {"sentiment": "neu", "score": score}
+
+    def _locked_predict(
+        self, sentences: Sentence | list[Sentence], **kwargs: Any
+    ) -> None:
+        with instrument.stage("flair.lock_wait"):
+            self.lock.acquire()
+        try:
+            with instrument.stage("flair"):
+                self.sia.predict(sentences, **kwargs)
+        finally:
+            self.lock.release()
+
+    def predict(self, text: str) -> dict[str, str | float]:
+        """Predict text sentiment"""
+
+        sentence = Sentence(text)
+        self._locked_predict(sentence)
+
+        return self._label(sentence)
+
+    def predict_many(
+        self, texts: list[str], batch_size: int = 32
+    ) -> list[dict[str, str | float]]:
+        """Predict sentiment for a batch of texts, in input order"""
+        sentences = [Sentence(text) for text in texts]
+        self._locked_predict(sentences, mini_batch_size=batch_size)
+
+        # Flair sorts sentences by length before splitting them into mini-batches
+        lengths = [len(sentence) for sentence in sentences]
+        for batch in length_batches(lengths, batch_size):
+            PADDING["flair"].add([lengths[i] for i in batch])
+
+        return [self._label(sentence) for sentence in sentences]
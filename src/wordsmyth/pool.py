@@ -0,0 +1,134 @@
+"""Multi-process model inference
+
+Every worker process loads Flair and TorchMoji once and rates batches of text,
+so a single machine can run as many predictions at once as it has workers."""
+from __future__ import annotations
+
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+from threading import BoundedSemaphore
+from typing import Any, Iterable
+
+from wordsmyth.items import Rating
+
+
+def _load_models(threads: int) -> None:
+    import torch
+
+    import wordsmyth
+
+    torch.set_num_threads(threads)
+    wordsmyth._models()
+
+
+def _rate_batch(texts: list[str], options: dict[str, Any]) -> list[Rating]:
+    from wordsmyth import rate_many
+
+    return rate_many(texts, batch_size=len(texts), **options)
+
+
+class InferencePool:
+    """A pool of worker processes running model inference.
+
+    - `workers` is the number of processes (one per CPU by default)
+    - `batch_size` is the largest batch of texts sent to a worker at once
+    - `max_pending` bounds the number of batches queued or running; submitting
+        more blocks until a batch finishes
+    - `threads` is the number of PyTorch threads per worker, which defaults to
+        splitting the machine's CPUs evenly between workers
+
+    Workers are started with `spawn` so PyTorch's threads are never forked."""
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        *,
+        batch_size: int = 32,
+        max_pending: int | None = None,
+        threads: int | None = None,
+        context: str = "spawn",
+    ) -> None:
+        workers = workers or os.cpu_count() or 1
+        threads = threads or max(1, (os.cpu_count() or 1) // workers)
+
+        self.batch_size = batch_size
+        self._pending = BoundedSemaphore(max_pending or workers * 2)
+        self._executor = ProcessPoolExecutor(
+            workers,
+            mp_context=get_context(context),
+            initializer=_load_models,
+            initargs=(threads,),
+        )
+
+    def __enter__(self) -> InferencePool:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def submit_many(
+        self,
+        texts: list[str],
+        *,
+        emojis: int = 10,
+        rounded: bool = True,
+        flags: bool = False,
+    ) -> Future[list[Rating]]:
+        """Queue a single batch of texts, blocking while the pool is saturated"""
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(
+                _rate_batch,
+                list(texts),
+                {"emojis": emojis, "rounded": rounded, "flags": flags},
+            )
+        except BaseException:
+            self._pending.release()
+            raise
+
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def rate(
+        self,
+        text: str,
+        *,
+        emojis: int = 10,
+        rounded: bool = True,
+        flags: bool = False,
+    ) -> Rating:
+        """Assign a star rating to text, like `wordsmyth.rate`"""
+        return self.submit_many(
+            [text], emojis=emojis, rounded=rounded, flags=flags
+        ).result()[0]
+
+    def rate_many(
+        self,
+        texts: Iterable[str],
+        *,
+        batch_size: int | None = None,
+        emojis: int = 10,
+        rounded: bool = True,
+        flags: bool = False,
+    ) -> list[Rating]:
+        """Assign star ratings to many texts, spreading batches across workers.
+
+        Results are returned in input order, like `wordsmyth.rate_many`.
+        `batch_size` overrides the pool's batch size for this call"""
+        texts = list(texts)
+        batch_size = batch_size or self.batch_size
+        futures = [
+            self.submit_many(
+                texts[start : start + batch_size],
+                emojis=emojis,
+                rounded=rounded,
+                flags=flags,
+            )
+            for start in range(0, len(texts), batch_size)
+        ]
+        return [rating for future in futures for rating in future.result()]
+
+    def close(self) -> None:
+        """Stop the workers once queued batches finish"""
+        self._executor.shutdown(wait=True)
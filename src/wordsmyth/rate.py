@@ -1,12 +1,19 @@
-"""The flagging and rating algorithm"""
+"""The flagging and rating algorithm
+
+NumPy is imported on first use to keep `import wordsmyth` fast"""
 
 from __future__ import annotations
 
-from typing import Any
+from typing import TYPE_CHECKING, Any, Sequence
 
-import numpy as np
+from wordsmyth import instrument
+from wordsmyth.constants import EMOJIS
+from wordsmyth.emojimap import NEG, POS, SENTIMENTS, Emojimap
+from wordsmyth.items import BatchEvaluation, Evaluation, Flags, Output
+from wordsmyth.lexicon import Lexicon, default_lexicon
 
-from wordsmyth.items import Evaluation, Flags, Output
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class Rater:
@@ -16,9 +23,16 @@ class Rater:
     - `sentiment_data` is a combination of predictions from TorchMoji and Flair results
     (https://kt.ijs.si/data/Emoji_sentiment_ranking/index.html)
     - `emojimap` is a mapping of emojis to their floating-point sentiment values in negativity,
-        neutrality, and positivity"""
-
-    def __init__(self, sentiment_data: Output, emojimap: list[dict]) -> None:
+        neutrality, and positivity. Pass a compiled `Emojimap` to share it between raters
+    - `lexicon` holds the conjunctions and laughing emojis flags look for in the
+        text, defaulting to the lexicons shipped with wordsmyth"""
+
+    def __init__(
+        self,
+        sentiment_data: Output,
+        emojimap: Emojimap | list[dict],
+        lexicon: Lexicon | None = None,
+    ) -> None:
         self.sentiment_data = sentiment_data
         self.metadata = Evaluation(
             content=sentiment_data.text,
@@ -34,10 +48,11 @@ class Rater:
         )
         self.flags: list[Flags] = []
 
-        self.fix_map: dict[str, dict] = {e["repr"]: e for e in emojimap}
-        self.fix_map[":cry:"]["sentiment"] = "neg"
-        self.fix_map[":grimacing:"]["sentiment"] = "neu"
-        self.rate_map = [value for key, value in self.fix_map.items()]
+        if not isinstance(emojimap, Emojimap):
+            emojimap = Emojimap.compile(emojimap)
+        self.emojimap = emojimap
+        self.lexicon = lexicon or default_lexicon()
+        self.fix_map = emojimap.entries
 
     @staticmethod
     def find_indices(content: list[str], classes: list[str]) -> list[int]:
@@ -54,7 +69,7 @@ class Rater:
         so this nudges TorchMoji in a better direction, I guess
         """
         m = self.metadata
-        emojimap: dict = self.fix_map
+        emojimap = self.fix_map
 
         target_emojis = [":confused:", ":thumbsup:", ":eyes:", ":smile:", ":persevere:"]
         emoji_indices = self.find_indices(self.sentiment_data.emojis, target_emojis)
@@ -122,31 +137,20 @@ class Rater:
     def flag(self) -> None:
         """Flags reviews based on factors for rating"""
         m = self.metadata
-        emojimap = self.rate_map
+        emojimap = self.emojimap
 
-        emojis_are_positive = [
-            e["repr"] in m.emojis
-            for e in [e for e in emojimap if e["sentiment"] == "pos"]
-        ]
-        emojis_are_negative = [
-            e["repr"] in m.emojis
-            for e in [e for e in emojimap if e["sentiment"] == "neg"]
-        ]
-        conjunctions = ["but", "although", "however"]
-        contradicting = m.score < 0.8 and emojis_are_negative.count(
-            True
-        ) < emojis_are_positive.count(True)
-        has_conjugations = (
-            any(word in m.content.lower().strip() for word in conjunctions)
-            and not contradicting
-        )
+        positive_emojis = sum(e in emojimap.positive for e in m.emojis)
+        negative_emojis = sum(e in emojimap.negative for e in m.emojis)
+        lexical = self.lexicon.find(m.content)
+        contradicting = m.score < 0.8 and negative_emojis < positive_emojis
+        has_conjugations = "conjunctions" in lexical and not contradicting
 
         conditions = {
             Flags.NEG_FLAIR_SENTIMENT: m.sentiment_flair == "neg",
             Flags.NEG_MAP_SENTIMENT: m.sentiment_map == "neg",
             Flags.POS_SENTIMENT: m.sentiment_map == "pos" and m.sentiment_flair == "pos",
-            Flags.CONTAINS_LAUGHING_EMOJI: "🤣" in m.content,
-            Flags.EMOJIS_ARE_POSITIVE: any(emojis_are_positive),
+            Flags.CONTAINS_LAUGHING_EMOJI: "laughing" in lexical,
+            Flags.EMOJIS_ARE_POSITIVE: positive_emojis > 0,
             Flags.NEG_SENTIMENT: m.sentiment_map == "neg" and m.sentiment_flair == "neg",
             Flags.NEG_FLAIR_CONTRADICTING: contradicting and m.sentiment_flair == "neg",
             Flags.NEG_MAP_CONTRADICTING: contradicting and m.sentiment_map == "neg",
@@ -158,39 +162,191 @@ class Rater:
 
     def rate(self, rounded: bool = True) -> int | float:
         """Rate some content provided to the Rater instance"""
-        self.fix_content()
-        self.flag()
+        import numpy as np
 
-        m = self.metadata
+        with instrument.stage("rater.fix_content"):
+            self.fix_content()
+        with instrument.stage("rater.flag"):
+            self.flag()
 
-        emoji_repr = m.fixed_emoji or m.emoji or m.emojis[0]
-        picked = [e for e in self.rate_map if e["repr"] == emoji_repr][0]
-        negativity_score: float = np.mean(  # type: ignore
-            [float(picked["pos"]), float(picked["neu"]), float(picked["neg"])]
-        )
+        with instrument.stage("rater.rate"):
+            m = self.metadata
 
-        def _match(var: Flags, cases: dict) -> Any:
-            return next(value for key, value in cases.items() if key == var)
-
-        for flag in self.flags:
-            negativity_score = _match(
-                flag,
-                {
-                    Flags.NEG_FLAIR_SENTIMENT: (
-                        negativity_score - 0.2 * float(picked["pos"])
-                    )
-                    * 2,
-                    Flags.NEG_MAP_SENTIMENT: negativity_score
-                    - 0.2 * float(picked["neg"]),
-                    Flags.POS_SENTIMENT: negativity_score - 0.2,
-                    Flags.CONTAINS_LAUGHING_EMOJI: negativity_score - 0.2,
-                    Flags.EMOJIS_ARE_POSITIVE: negativity_score - 0.2,
-                    Flags.NEG_SENTIMENT: negativity_score + 0.5,
-                    Flags.NEG_FLAIR_CONTRADICTING: negativity_score - 0.2,
-                    Flags.NEG_FLAIR_CONJUGATIONS: negativity_score - 0.2,
-                    Flags.POS_FLAIR_CONJUGATIONS: negativity_score + 0.2,
-                },
+            emoji_repr = m.fixed_emoji or m.emoji or m.emojis[0]
+            picked = self.fix_map[emoji_repr]
+            negativity_score: float = np.mean(  # type: ignore
+                [float(picked["pos"]), float(picked["neu"]), float(picked["neg"])]
             )
 
-        rating = min(5, (round(1 - negativity_score, 4) / 2))
-        return round(min(5, rating * 10)) if rounded else rating
+            def _match(var: Flags, cases: dict) -> Any:
+                return next(value for key, value in cases.items() if key == var)
+
+            for flag in self.flags:
+                negativity_score = _match(
+                    flag,
+                    {
+                        Flags.NEG_FLAIR_SENTIMENT: (
+                            negativity_score - 0.2 * float(picked["pos"])
+                        )
+                        * 2,
+                        Flags.NEG_MAP_SENTIMENT: negativity_score
+                        - 0.2 * float(picked["neg"]),
+                        Flags.POS_SENTIMENT: negativity_score - 0.2,
+                        Flags.CONTAINS_LAUGHING_EMOJI: negativity_score - 0.2,
+                        Flags.EMOJIS_ARE_POSITIVE: negativity_score - 0.2,
+                        Flags.NEG_SENTIMENT: negativity_score + 0.5,
+                        Flags.NEG_FLAIR_CONTRADICTING: negativity_score - 0.2,
+                        Flags.NEG_MAP_CONTRADICTING: negativity_score,
+                        Flags.NEG_FLAIR_CONJUGATIONS: negativity_score - 0.2,
+                        Flags.POS_FLAIR_CONJUGATIONS: negativity_score + 0.2,
+                    },
+                )
+
+            rating = min(5, (round(1 - negativity_score, 4) / 2))
+            return round(min(5, rating * 10)) if rounded else rating
+
+
+def batch_top_elements(array: np.ndarray, k: int) -> np.ndarray:
+    """Select the indices of the maximum elements of every row of a 2D Numpy array"""
+    import numpy as np
+
+    ind = np.argpartition(array, -k, axis=1)[:, -k:]
+    order = np.argsort(np.take_along_axis(array, ind, axis=1), axis=1)[:, ::-1]
+    return np.take_along_axis(ind, order, axis=1)
+
+
+class BatchRater:
+    """Vectorized `Rater` which scores a whole batch of model outputs at once.
+
+    Emoji sentiments and scores are precomputed into arrays indexed like TorchMoji's
+    output, so fixing, flagging and rating are array operations over the batch.
+    Results are identical to running `Rater` on every review with the same
+    `lexicon`."""
+
+    flag_order = (
+        Flags.NEG_FLAIR_SENTIMENT,
+        Flags.NEG_MAP_SENTIMENT,
+        Flags.POS_SENTIMENT,
+        Flags.CONTAINS_LAUGHING_EMOJI,
+        Flags.EMOJIS_ARE_POSITIVE,
+        Flags.NEG_SENTIMENT,
+        Flags.NEG_FLAIR_CONTRADICTING,
+        Flags.NEG_MAP_CONTRADICTING,
+        Flags.NEG_FLAIR_CONJUGATIONS,
+        Flags.POS_FLAIR_CONJUGATIONS,
+    )
+
+    def __init__(
+        self, emojimap: Emojimap | list[dict], lexicon: Lexicon | None = None
+    ) -> None:
+        import numpy as np
+
+        if not isinstance(emojimap, Emojimap):
+            emojimap = Emojimap.compile(emojimap)
+
+        target_emojis = [":confused:", ":thumbsup:", ":eyes:", ":smile:", ":persevere:"]
+        self.targets = np.array([emoji in target_emojis for emoji in EMOJIS])
+        self.sentiments = emojimap.sentiments
+        self.pos = emojimap.pos
+        self.neu = emojimap.neu
+        self.neg = emojimap.neg
+        self.lexicon = lexicon or default_lexicon()
+
+    def lexical_features(self, texts: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Conjunction and laughing emoji matches for every text"""
+        import numpy as np
+
+        found = [self.lexicon.find(text) for text in texts]
+        return (
+            np.array(["conjunctions" in lexical for lexical in found], dtype=bool),
+            np.array(["laughing" in lexical for lexical in found], dtype=bool),
+        )
+
+    def evaluate(
+        self,
+        probabilities: np.ndarray,
+        labels: Sequence[str],
+        scores: Sequence[float],
+        texts: Sequence[str],
+        *,
+        emojis: int = 10,
+        rounded: bool = True,
+    ) -> BatchEvaluation:
+        """Rate a batch of reviews from an (N, 64) TorchMoji probability matrix
+        and N Flair labels and scores"""
+        import numpy as np
+
+        rows = np.arange(len(probabilities))
+        top = batch_top_elements(np.asarray(probabilities), emojis)
+        top_sentiments = self.sentiments[top]
+        flair = np.array([SENTIMENTS.index(label) for label in labels], dtype=np.int8)
+        score = np.asarray(scores, dtype=float)
+
+        # fix_content: the first target emoji decides the map sentiment
+        is_target = self.targets[top]
+        has_target = is_target.any(axis=1)
+        emoji = top[rows, is_target.argmax(axis=1)]
+        sentiment_map = np.where(has_target, self.sentiments[emoji], -1)
+
+        pos_count = (top_sentiments == POS).sum(axis=1)
+        neg_count = (top_sentiments == NEG).sum(axis=1)
+        mismatch = has_target & (flair != sentiment_map)
+        agrees = top_sentiments == flair[:, None]
+        fixed = top[rows, agrees.argmax(axis=1)]
+        sentiment_map = np.where(
+            mismatch, np.where(pos_count > neg_count, POS, NEG), sentiment_map
+        )
+        picked = np.where(
+            mismatch & agrees.any(axis=1), fixed, np.where(has_target, emoji, top[:, 0])
+        )
+
+        # flag
+        has_conjunctions, laughing = self.lexical_features(texts)
+        contradicting = (score < 0.8) & (neg_count < pos_count)
+        has_conjugations = has_conjunctions & ~contradicting
+        flair_neg, flair_pos = flair == NEG, flair == POS
+        map_neg = sentiment_map == NEG
+        flags = np.column_stack(
+            [
+                flair_neg,
+                map_neg,
+                (sentiment_map == POS) & flair_pos,
+                laughing,
+                pos_count > 0,
+                map_neg & flair_neg,
+                contradicting & flair_neg,
+                contradicting & map_neg,
+                has_conjugations & flair_neg,
+                has_conjugations & flair_pos,
+            ]
+        )
+
+        # rate, applying adjustments in flag order like `Rater.rate`
+        pos, neg = self.pos[picked], self.neg[picked]
+        negativity = (pos + self.neu[picked] + neg) / 3
+        adjustments = [
+            lambda s: (s - 0.2 * pos) * 2,
+            lambda s: s - 0.2 * neg,
+            lambda s: s - 0.2,
+            lambda s: s - 0.2,
+            lambda s: s - 0.2,
+            lambda s: s + 0.5,
+            lambda s: s - 0.2,
+            lambda s: s,
+            lambda s: s - 0.2,
+            lambda s: s + 0.2,
+        ]
+        for column, adjust in enumerate(adjustments):
+            negativity = np.where(flags[:, column], adjust(negativity), negativity)
+
+        ratings = np.minimum(5, np.round(1 - negativity, 4) / 2)
+        if rounded:
+            ratings = np.round(np.minimum(5, ratings * 10)).astype(int)
+
+        return BatchEvaluation(emojis=top, picked=picked, flags=flags, ratings=ratings)
+
+    def flag_lists(self, flags: np.ndarray) -> list[list[Flags]]:
+        """Convert a flag matrix from `evaluate` into lists of `Flags`"""
+        return [
+            [flag for flag, set_ in zip(self.flag_order, row) if set_] for row in flags
+        ]
@@ -0,0 +1,155 @@
+"""Storage for rated review corpora
+
+All reviews live in one SQLite table with flags packed into an integer bitmask
+(see `flags_to_mask`), and are written in batches inside transactions. Corpora
+can be exported to Apache Parquet (requires `pyarrow`) for vectorized reads."""
+from __future__ import annotations
+
+import sqlite3
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Iterable, Iterator, Optional
+
+from wordsmyth.items import Flags, flags_to_mask, mask_to_flags
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews(
+    id INTEGER PRIMARY KEY,
+    product_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    actual INTEGER,
+    prediction REAL,
+    flags INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS reviews_product_id ON reviews(product_id);
+"""
+
+
+@dataclass
+class RatedReview:
+    """A review, the rating its author gave and the rating wordsmyth predicted"""
+
+    product_id: str
+    text: str
+    actual: Optional[int]
+    prediction: Optional[float]
+    flags: list[Flags] = field(default_factory=list)
+
+
+class ReviewStore:
+    """A SQLite database of rated reviews, safe to share between threads"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+
+    def __enter__(self) -> ReviewStore:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def add_many(self, reviews: Iterable[RatedReview]) -> int:
+        """Insert reviews in a single transaction, returning how many were added"""
+        rows = [
+            (r.product_id, r.text, r.actual, r.prediction, flags_to_mask(r.flags))
+            for r in reviews
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO reviews(product_id, text, actual, prediction, flags) "
+                "VALUES(?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def products(self) -> list[str]:
+        """IDs of every product with stored reviews"""
+        with self.lock:
+            return [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT DISTINCT product_id FROM reviews ORDER BY product_id"
+                )
+            ]
+
+    def read(
+        self, product_id: str | None = None, batch_size: int = 10_000
+    ) -> Iterator[RatedReview]:
+        """Lazily read stored reviews, optionally only those of one product"""
+        query = "SELECT product_id, text, actual, prediction, flags FROM reviews"
+        params: tuple = ()
+        if product_id is not None:
+            query += " WHERE product_id = ?"
+            params = (product_id,)
+
+        for rows in self._scan(query + " ORDER BY id", params, batch_size):
+            for product, text, actual, prediction, flags in rows:
+                yield RatedReview(product, text, actual, prediction, mask_to_flags(flags))
+
+    def _scan(self, query: str, params: tuple, batch_size: int) -> Iterator[list]:
+        # a separate connection, so long scans don't hold up writers. In-memory
+        # databases only exist on their own connection, which is shared instead
+        shared = self.path in ("", ":memory:")
+        conn = self.conn if shared else sqlite3.connect(self.path)
+        lock = self.lock if shared else nullcontext()
+        try:
+            with lock:
+                cursor = conn.execute(query, params)
+            while True:
+                with lock:
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            if not shared:
+                conn.close()
+
+    def export_parquet(self, path: str, batch_size: int = 100_000) -> int:
+        """Write every review to a Parquet file in row groups of `batch_size`,
+        returning the number of rows written. Flags stay packed as a bitmask"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(
+                "Parquet export requires pyarrow, install wordsmyth[storage]"
+            ) from e
+
+        schema = pa.schema(
+            [
+                ("product_id", pa.string()),
+                ("text", pa.string()),
+                ("actual", pa.int8()),
+                ("prediction", pa.float32()),
+                ("flags", pa.uint16()),
+            ]
+        )
+        written = 0
+        with pq.ParquetWriter(path, schema) as writer:
+            for rows in self._scan(
+                "SELECT product_id, text, actual, prediction, flags FROM reviews "
+                "ORDER BY id",
+                (),
+                batch_size,
+            ):
+                columns = list(zip(*rows))
+                writer.write_table(
+                    pa.Table.from_arrays(
+                        [pa.array(c, type=f.type) for c, f in zip(columns, schema)],
+                        schema=schema,
+                    )
+                )
+                written += len(rows)
+        return written
+
+    def close(self) -> None:
+        """Close the database"""
+        self.conn.close()
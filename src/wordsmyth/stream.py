@@ -0,0 +1,180 @@
+"""Streaming ratings for inputs too large to hold in memory
+
+Reading, model inference and the rating rules each run in their own stage,
+connected by bounded queues so memory stays flat however large the input is."""
+from __future__ import annotations
+
+import csv
+import json
+from itertools import count, islice
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from typing import IO, Any, Callable, Iterable, Iterator, Tuple, Union
+
+from wordsmyth.items import Flags
+
+Record = Tuple[Any, str]
+Source = Union[IO[str], Iterable[Union[str, Record]]]
+
+FORMATS = ("auto", "lines", "jsonl", "csv")
+_DONE = object()
+
+
+def _guess_format(source: IO[str], first: str) -> str:
+    name = str(getattr(source, "name", ""))
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson")) or first.lstrip().startswith("{"):
+        return "jsonl"
+    return "lines"
+
+
+def read_records(
+    source: Source,
+    format: str = "auto",
+    *,
+    text_field: str = "text",
+    id_field: str = "id",
+) -> Iterator[Record]:
+    """Lazily read `(id, text)` records from a file or an iterable.
+
+    Files are read as one review per line, JSONL or CSV (`format`, guessed from the
+    file name or first line when `auto`). JSONL and CSV rows take their text and id
+    from `text_field` and `id_field`. Records without an id are numbered from 0, and
+    iterables may hold either texts or `(id, text)` tuples"""
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}, expected one of {FORMATS}")
+
+    numbers = count()
+    if not hasattr(source, "readline"):
+        for item in source:
+            n = next(numbers)
+            yield (n, item) if isinstance(item, str) else item  # type: ignore
+        return
+
+    lines: Iterator[str] = iter(source)  # type: ignore
+    first = next(lines, None)
+    if first is None:
+        return
+    if format == "auto":
+        format = _guess_format(source, first)  # type: ignore
+    lines = _chain(first, lines)
+
+    if format == "csv":
+        for row in csv.DictReader(lines):
+            n = next(numbers)
+            yield row.get(id_field) or n, row[text_field]
+    elif format == "jsonl":
+        for line in lines:
+            if line.strip():
+                n = next(numbers)
+                row = json.loads(line)
+                yield row.get(id_field, n), row[text_field]
+    else:
+        for line in lines:
+            if line.strip():
+                yield next(numbers), line.rstrip("\n")
+
+
+def _chain(first: str, rest: Iterator[str]) -> Iterator[str]:
+    yield first
+    yield from rest
+
+
+def _put(queue: Queue, item: Any, stop: Event) -> bool:
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _stage(
+    target: Callable[[], Iterable[Any]], output: Queue, stop: Event
+) -> Thread:
+    """Run a producer in a thread, forwarding its items and any exception to `output`"""
+
+    def run() -> None:
+        try:
+            for item in target():
+                if not _put(output, item, stop):
+                    return
+        except BaseException as exc:
+            _put(output, exc, stop)
+            return
+        _put(output, _DONE, stop)
+
+    thread = Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _drain(queue: Queue, stop: Event) -> Iterator[Any]:
+    while not stop.is_set():
+        try:
+            item = queue.get(timeout=0.1)
+        except Empty:
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def rate_stream(
+    source: Source,
+    *,
+    format: str = "auto",
+    batch_size: int = 64,
+    prefetch: int = 4,
+    emojis: int = 10,
+    rounded: bool = True,
+    flags: bool = False,
+    precision: str | None = None,
+    text_field: str = "text",
+    id_field: str = "id",
+) -> Iterator[tuple[Any, (int | float), list[Flags] | None]]:
+    """Lazily rate records from a file or an iterable, yielding `(id, rating, flags)`
+    in input order.
+
+    Batches are read ahead and sent through the models in a background thread while
+    earlier batches are rated; at most `prefetch` batches wait between stages.
+    See `read_records` for the accepted inputs"""
+    from wordsmyth import _predict, _rate_predictions
+
+    records = read_records(source, format, text_field=text_field, id_field=id_field)
+    stop = Event()
+    batches: Queue = Queue(prefetch)
+    predicted: Queue = Queue(prefetch)
+
+    def read() -> Iterator[list[Record]]:
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def predict() -> Iterator[tuple[list[Record], list]]:
+        for batch in _drain(batches, stop):
+            texts = [text for _, text in batch]
+            yield batch, _predict(texts, batch_size, precision=precision)
+
+    _stage(read, batches, stop)
+    _stage(predict, predicted, stop)
+
+    try:
+        for batch, predictions in _drain(predicted, stop):
+            ratings = _rate_predictions(
+                predictions,
+                [text for _, text in batch],
+                emojis=emojis,
+                rounded=rounded,
+                flags=flags,
+            )
+            for (id_, _), (rating, flags_) in zip(batch, ratings):
+                yield id_, rating, flags_
+    finally:
+        stop.set()
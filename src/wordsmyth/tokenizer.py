@@ -0,0 +1,52 @@
+"""Cached TorchMoji tokenization
+
+TorchMoji's `SentenceTokenizer` splits every text with its regex word generator and
+looks each word up in the vocabulary, building Python lists along the way. The
+`Tokenizer` here splits words with the same word generator, so its token IDs are
+identical, but memoizes the IDs of each text and writes a whole batch into one
+int32 array."""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from torchmoji.sentence_tokenizer import SentenceTokenizer
+
+
+class Tokenizer:
+    """Tokenizes texts into rows of TorchMoji vocabulary IDs, truncated and
+    zero-padded to `fixed_length`.
+
+    The IDs of the last `cache_size` distinct texts are kept, so repeated texts
+    (and texts rated again) skip word splitting and vocabulary lookups"""
+
+    def __init__(
+        self, vocabulary: dict[str, int], fixed_length: int, cache_size: int = 65536
+    ) -> None:
+        reference = SentenceTokenizer(vocabulary, fixed_length)
+        self.wordgen = reference.wordgen
+        self.vocabulary = vocabulary
+        self.fixed_length = fixed_length
+        self.unknown = reference.unknown_value
+        self.token_ids = lru_cache(maxsize=cache_size)(self._token_ids)
+
+    def _token_ids(self, text: str) -> Optional[Tuple[int, ...]]:
+        """Vocabulary IDs of a text's words, or None if TorchMoji would skip it"""
+        valid, words, _ = self.wordgen.extract_valid_sentence_words(text)
+        if not valid or not words:
+            return None
+        lookup, unknown = self.vocabulary.get, self.unknown
+        return tuple(lookup(word, unknown) for word in words[: self.fixed_length])
+
+    def tokenize(self, texts: Sequence[str]) -> np.ndarray:
+        """Tokenize a batch of texts into a `(len(texts), fixed_length)` array.
+
+        Raises ValueError if a text has no words TorchMoji can read"""
+        tokens = np.zeros((len(texts), self.fixed_length), np.int32)
+        for row, text in zip(tokens, texts):
+            ids = self.token_ids(text)
+            if ids is None:
+                raise ValueError("TorchMoji could not tokenize every text in the batch")
+            row[: len(ids)] = ids
+        return tokens
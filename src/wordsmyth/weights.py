@@ -0,0 +1,63 @@
+"""Memory-mapped model weights
+
+Weights are exported as one `.npy` file per tensor, which every process maps
+copy-on-write instead of reading into private memory. Processes using the same
+export share the same physical pages."""
+from __future__ import annotations
+
+import json
+import os
+from typing import Mapping
+
+import numpy as np
+import torch
+from torch import nn
+
+INDEX_FILE = "index.json"
+
+
+def export_weights(state_dict: Mapping[str, torch.Tensor], directory: str) -> None:
+    """Write a state dict to a directory of memory-mappable `.npy` files"""
+    os.makedirs(directory, exist_ok=True)
+
+    index = {}
+    for i, (name, tensor) in enumerate(state_dict.items()):
+        filename = f"{i}.npy"
+        np.save(os.path.join(directory, filename), tensor.detach().cpu().numpy())
+        index[name] = filename
+
+    with open(os.path.join(directory, INDEX_FILE), "w", encoding="utf-8") as fh:
+        json.dump(index, fh, indent=2)
+
+
+def load_weights(directory: str) -> dict[str, torch.Tensor]:
+    """Map an exported state dict into memory without copying it"""
+    with open(os.path.join(directory, INDEX_FILE), encoding="utf-8") as fh:
+        index: dict[str, str] = json.load(fh)
+
+    return {
+        name: torch.from_numpy(np.load(os.path.join(directory, filename), mmap_mode="c"))
+        for name, filename in index.items()
+    }
+
+
+def bind_weights(module: nn.Module, directory: str) -> nn.Module:
+    """Point a module's parameters and persistent buffers at memory-mapped weights.
+
+    Any weights the module already held are released. Non-persistent buffers are
+    never exported, so they keep the values the module computed for them"""
+    weights = load_weights(directory)
+    persistent = module.state_dict().keys()
+    tensors = dict(module.named_parameters())
+    tensors.update(module.named_buffers())
+    tensors = {name: tensor for name, tensor in tensors.items() if name in persistent}
+
+    missing = tensors.keys() - weights.keys()
+    if missing:
+        raise ValueError(f"Exported weights are missing {', '.join(sorted(missing))}")
+
+    with torch.no_grad():
+        for name, tensor in tensors.items():
+            tensor.data = weights[name]
+
+    return module